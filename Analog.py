@@ -29,6 +29,9 @@ TOLERANCE = 4
 pot_min = 511
 pot_max = 1023
 goal = None
+sample_interval = 0.015625 # Seconds between ADC reads; the governor slows this down when power's short
+max_speed = 100 # Motor duty cycle ceiling, likewise
+goal_done = None # Called with the final position whenever the motor gives up a goal, reached or not
 interp_values = [511, 538, 569, 603, 643, 689, 739, 799, 869, 955, 1023] # 0-100% travel values
 dead_zone_low = 2
 dead_zone_high = 3
@@ -36,7 +39,7 @@ dead_zone_high = 3
 async def read_position():
 	last_read = 0	# this keeps track of the last potentiometer value
 	while True:
-		await asyncio.sleep(0.015625)
+		await asyncio.sleep(sample_interval)
 		# we'll assume that the pot didn't move
 		pot_changed = False
 		# read the analog pin
@@ -107,16 +110,24 @@ async def read_value():
 	last_dir = None
 	goal_completed = 0
 	safety = collections.deque([0] * 2, 5)
+	seeking = None
 	try:
 		async for pos in read_position():
 			if goal is not None:
-				safety.append(pos)
 				if goal < 0:
 					goal = 0
 					print("Goal set to 0")
 				if goal > 100:
 					goal = 100
 					print("Goal set to 100")
+				if goal != seeking:
+					# A new goal, maybe reversing the old one. Don't let the
+					# positions from before it (or the moment the motor takes
+					# to turn around) trip the safety brakes.
+					seeking = goal
+					safety.clear()
+					safety.append(-1)
+				safety.append(pos)
 				if goal > pos:
 					dir = Motor.forward
 					print("Moving forward")
@@ -134,7 +145,7 @@ async def read_value():
 				else:
 					speed = 0
 					dir = Motor.brake
-					goal = None
+					goal = seeking = None
 					goal_completed = time.monotonic()
 					safety.append(-1)
 				if max(safety) - min(safety) < 0.1: # Guard against getting stuck
@@ -142,15 +153,18 @@ async def read_value():
 					print("Safety brakes engaged")
 					speed = 0
 					dir = Motor.brake
-					goal = None
+					goal = seeking = None
 					goal_completed = time.monotonic()
 				print(dir.__name__, speed, dist)
+				speed = speed * max_speed // 100
 				if speed != last_speed:
 					Motor.speed(speed)
 					last_speed = speed
 				if dir is not last_dir:
 					dir()
 					last_dir = dir
+				if goal is None and goal_done:
+					goal_done(pos)
 			else:
 				if time.monotonic() > goal_completed + 0.15:
 					yield(pos)
@@ -0,0 +1,115 @@
+# Timed fades for BioBox channels
+# A single fixed-rate ticker drives every active fade, so twenty channels
+# fading at once cost no more wakeups than one. Each tick hands the new value
+# to the channel's refract_value(), which takes care of the slider, the motor
+# (if the channel is selected) and the rate-limited write to the backend.
+import asyncio
+import math
+import time
+
+TICK = 1 / 50 # Seconds between scheduler ticks
+
+curves = {
+	"linear": lambda x: x,
+	# Fast at first, slowing towards the target - sounds even on a fade-out
+	"log": lambda x: math.log10(1 + 9 * x),
+	"scurve": lambda x: (1 - math.cos(math.pi * x)) / 2,
+}
+
+fades = { } # Channel to its active Fade
+ticker = None
+jitter = [] # Lateness of each tick (seconds) while any fade is running
+
+class Fade():
+	def __init__(self, channel, target, duration, curve):
+		self.channel = channel
+		self.origin = channel.oldvalue
+		self.target = target
+		self.start = time.monotonic()
+		self.duration = max(duration, TICK)
+		self.curve = curves[curve]
+		self.ticks = 0
+		self.writes_before = getattr(channel, "external_writes", 0)
+		self.done = asyncio.get_running_loop().create_future()
+
+	def value_at(self, now):
+		progress = min((now - self.start) / self.duration, 1.0)
+		return self.origin + (self.target - self.origin) * self.curve(progress), progress >= 1.0
+
+def fade(channel, target, duration, curve="linear"):
+	"""Ramp channel to target over duration seconds
+
+	Returns a future which resolves when the fade completes, or is cancelled
+	if another fade on the same channel supersedes it.
+	"""
+	global ticker
+	old = fades.get(channel)
+	if old:
+		old.done.cancel()
+	fades[channel] = f = Fade(channel, target, duration, curve)
+	if ticker is None or ticker.done():
+		ticker = asyncio.create_task(tick())
+	return f.done
+
+def cancel(channel):
+	f = fades.pop(channel, None)
+	if f:
+		f.done.cancel()
+
+async def tick():
+	# Deadlines are computed from the start time rather than by sleeping a
+	# fixed amount each time, so the rate doesn't drift with callback load.
+	loop = asyncio.get_running_loop()
+	next_tick = loop.time()
+	jitter.clear()
+	while fades:
+		jitter.append(loop.time() - next_tick)
+		now = time.monotonic()
+		for channel, f in list(fades.items()):
+			if f.done.done(): # Cancelled from outside
+				del fades[channel]
+				continue
+			value, finished = f.value_at(now)
+			f.ticks += 1
+			channel.refract_value(value, "automation")
+			if finished:
+				del fades[channel]
+				f.done.set_result(value)
+				report(f)
+		next_tick += TICK
+		await asyncio.sleep(max(next_tick - loop.time(), 0))
+
+def report(f):
+	writes = getattr(f.channel, "external_writes", 0) - f.writes_before
+	late = sorted(jitter)
+	print(time.time(), "Fade on %s done: %d ticks, %d backend writes, tick jitter p50 %.2fms max %.2fms" % (
+		f.channel.channel_name, f.ticks, writes, late[len(late) // 2] * 1000, late[-1] * 1000))
+
+if __name__ == "__main__":
+	# Benchmark the scheduler: twenty channels fading for five seconds. The
+	# stand-in channels write through the same Limiter as BioBox's, so the
+	# write counts are what the backends would actually get.
+	import Limiter
+	class Channel():
+		def __init__(self, name):
+			self.channel_name = name
+			self.oldvalue = 100.0
+			self.limiter = Limiter.Limiter(lambda value: None)
+		@property
+		def external_writes(self):
+			return self.limiter.writes
+		def refract_value(self, value, source):
+			if value != self.oldvalue:
+				self.limiter.send(value)
+			self.oldvalue = value
+	async def main():
+		channels = [Channel("Bench %d" % i) for i in range(20)]
+		start = time.monotonic()
+		await asyncio.gather(*[fade(channel, 0, 5, curve)
+			for channel, curve in zip(channels, list(curves) * 7)])
+		await asyncio.sleep(Limiter.INTERVAL) # Let the last writes through
+		elapsed = time.monotonic() - start
+		writes = sum(channel.external_writes for channel in channels)
+		print("%d channels: %d backend writes in %.2fs, %.1f per channel per second (limit %.0f)" % (
+			len(channels), writes, elapsed, writes / len(channels) / elapsed, 1 / Limiter.INTERVAL))
+	asyncio.run(main())
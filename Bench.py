@@ -0,0 +1,498 @@
+# End-to-end benchmark: BioBox against the stand-in backends in Mock.py
+# Runs BioBox.py as a child process with a generated config pointing every
+# backend at a mock, drives it over OSC, and watches what reaches the mocks.
+# Every scenario runs a fader drag on a VLC and an OBS channel, measuring how
+# long each value takes from the OSC packet to the backend, while putting its
+# own load on top:
+#
+#   drag       nothing else; also counts the OSC feedback that shows the
+#              fader pulled back by an echo (redundant round trips)
+#   scenes     OBS switches scene every half second
+#   tabs       browser tabs connect and disconnect in a constant storm
+#   reconnect  every TellMeVLC connection is dropped every two seconds; also
+#              times each drop until BioBox has connected again
+#   vlc10      ten TellMeVLC instances; also times startup until all are up
+#   pulse50    no drag; instead, fifty streams play into a null sink on the
+#              local PulseAudio/PipeWire server, and their volumes are changed
+#              there in turn, timing each change until BioBox reports it over
+#              OSC. Meanwhile streams keep stopping and new ones starting in
+#              their place, timing each until BioBox reports the new channel,
+#              and BioBox's own account of what making and removing those
+#              channels cost it is shown (needs pactl, pacat and pulsectl)
+#   duck       no drag; instead, the mock meters step the Mic above and below
+#              the ducking threshold, timing each step until the ducked (and
+#              fully ducked) write to the Music source reaches the mock
+#   warmstart  no drag; BioBox is launched twice against the same mocks, first
+#              with no state cache and then with the one the first run left,
+#              timing each from launch until the fader is in place for the
+#              live selected channel
+#   groupN     no drag; instead, a group master over N OBS sources is moved
+#              over OSC, timing each move until the ExecuteBatch carrying
+#              every member reaches the mock (group2, group10, group50, ...)
+#
+# Usage: python3 Bench.py [scenario...] [--seconds N] [--latency MS] [--jitter MS]
+# Needs a display for GTK; if DISPLAY isn't set, Xvfb is started for the run.
+import argparse
+import asyncio
+import bisect
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import Mock
+import OSC
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASE_PORT = 24200
+PULSE_STREAMS = 50
+DUCKING = {"trigger": "Mic", "targets": ["Music"], "threshold": -30, "depth": -15, "attack": 0.05, "release": 0.5}
+drops = [] # When the reconnect scenario dropped the TellMeVLC connections
+trigger_peak = 0.001 # What the mock meters say the Mic is peaking at: -60dB
+CONFIG = """
+host = "127.0.0.1"
+vlc_port = {vlc_port}
+vlc_instances = {vlc_instances!r}
+webcam_user = "mock"
+webcam_control_path = "camera.py"
+webcams = {{"Focus": "/dev/mock0"}}
+webcam_command = [{python!r}, {mock!r}, "camera"]
+obs_port = {obs_port}
+obs_meter_port = {meter_port}
+osc_port = {osc_port}
+state_cache = "state_cache.json"
+snapshot_file = "snapshots.json"
+channel_groups = {groups!r}
+ducking = {ducking!r}
+"""
+
+def cpu_seconds(pid):
+	with open("/proc/%d/stat" % pid) as f:
+		fields = f.read().rsplit(")", 1)[1].split()
+	return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def percentile(values, pct):
+	values = sorted(values)
+	return values[min(len(values) * pct // 100, len(values) - 1)] * 1000 if values else math.nan
+
+class Controller(asyncio.DatagramProtocol):
+	# OSC client: drives BioBox and notes when channels show up in feedback
+	def __init__(self):
+		self.seen = { } # Channel name to time first reported
+		self.volumes = [] # (time, channel name, volume) for every report
+	def datagram_received(self, data, addr):
+		now = time.perf_counter()
+		for address, args in OSC.parse(data):
+			parts = address.split("/")
+			if len(parts) == 4 and parts[2] not in self.seen:
+				self.seen[parts[2]] = now
+			if len(parts) == 4 and parts[3] == "volume" and args:
+				self.volumes.append((now, parts[2], args[0]))
+
+async def run(scenario, seconds, port=BASE_PORT):
+	loop = asyncio.get_running_loop()
+	vlc_count = 10 if scenario == "vlc10" else 1
+	vlc_instances = {("VLC" if n == 0 else "VLC%d" % n): ("127.0.0.1", port + n) for n in range(vlc_count)}
+	obs_port, meter_port, osc_port, tab_port = port + 20, port + 21, port + 22, 8888
+	members = ["Member%02d" % n for n in range(int(scenario[5:]))] if scenario.startswith("group") else []
+	groups = {"Bench": {name: 0 for name in members}} if members else {}
+	tmp = tempfile.mkdtemp(prefix="biobox-bench-")
+	with open(os.path.join(tmp, "config.py"), "w") as f:
+		f.write(CONFIG.format(vlc_port=port, vlc_instances=vlc_instances, python=sys.executable,
+			mock=os.path.join(HERE, "Mock.py"), obs_port=obs_port, meter_port=meter_port, osc_port=osc_port, groups=groups,
+			ducking=DUCKING if scenario == "duck" else None))
+	main_scene = Mock.scenes["Main"]
+	Mock.scenes["Main"] = main_scene + members
+	Mock.received.clear()
+	Mock.tracking = True
+	mocks = [asyncio.create_task(Mock.vlc(p, name=name)) for name, (host, p) in vlc_instances.items()]
+	mocks.append(asyncio.create_task(Mock.obs(obs_port)))
+	mocks.append(asyncio.create_task(Mock.obs_meters(meter_port, levels=lambda name: trigger_peak if name == "Mic" else 0.01)))
+	pulse = await pulse_streams(PULSE_STREAMS) if scenario == "pulse50" else None
+	await asyncio.sleep(0.2)
+	env = dict(os.environ, BIOBOX_CONFIG=os.path.join(tmp, "config.py"),
+		MOCK_LATENCY=str(Mock.latency), MOCK_JITTER=str(Mock.jitter))
+	log = open(os.path.join(tmp, "biobox.log"), "w") if pulse else subprocess.DEVNULL
+	if pulse:
+		env["PYTHONUNBUFFERED"] = "1" # So the channel costs it reports can be read as it goes
+	launched = time.perf_counter()
+	biobox = await asyncio.create_subprocess_exec(sys.executable, os.path.join(HERE, "BioBox.py"),
+		cwd=tmp, env=env, stdout=log, stderr=subprocess.DEVNULL)
+	transport, controller = await loop.create_datagram_endpoint(Controller, remote_addr=("127.0.0.1", osc_port))
+	results = {"scenario": scenario}
+	try:
+		# Wait for every channel we're going to use to be there
+		if pulse:
+			wanted = set(pulse["streams"])
+		elif members:
+			wanted = set(members) | {"Bench"}
+		else:
+			wanted = set(vlc_instances) | {"Mic"}
+		deadline = time.perf_counter() + 20
+		while not wanted <= set(controller.seen):
+			if time.perf_counter() > deadline or biobox.returncode is not None:
+				raise RuntimeError("BioBox never reported %s" % ", ".join(sorted(wanted - set(controller.seen))))
+			transport.sendto(OSC.encode("/subscribe"))
+			await asyncio.sleep(0.1)
+		results["startup"] = max(controller.seen[name] for name in wanted) - launched
+		if pulse:
+			cpu_before = cpu_seconds(biobox.pid)
+			start = time.perf_counter()
+			latencies, appeared = await pulse_changes(pulse, controller, seconds)
+			elapsed = time.perf_counter() - start
+			results.update(cpu=(cpu_seconds(biobox.pid) - cpu_before) / elapsed * 100, messages=len(latencies) / elapsed,
+				p50=percentile(latencies, 50), p99=percentile(latencies, 99), matched=len(latencies))
+			print("pulse50: new stream to new channel p50 %.2fms p99 %.2fms over %d streams" % (
+				percentile(appeared, 50), percentile(appeared, 99), len(appeared)))
+			await asyncio.sleep(5.5) # BioBox reports what its channels cost every five seconds
+			with open(log.name) as f:
+				costs = [line.split("PulseAudio channels: ", 1)[1].strip() for line in f if "PulseAudio channels: " in line]
+			print("pulse50: BioBox made and removed %s" % (costs[-1] if costs else "nothing it reported"))
+			return results
+		if members:
+			cpu_before = cpu_seconds(biobox.pid)
+			start = time.perf_counter()
+			latencies, messages = await group_moves(transport, members, seconds)
+			elapsed = time.perf_counter() - start
+			results.update(cpu=(cpu_seconds(biobox.pid) - cpu_before) / elapsed * 100, messages=messages / elapsed,
+				p50=percentile(latencies, 50), p99=percentile(latencies, 99), matched=len(latencies))
+			return results
+		if scenario == "duck":
+			cpu_before = cpu_seconds(biobox.pid)
+			start = time.perf_counter()
+			first, full = await duck_steps(seconds)
+			elapsed = time.perf_counter() - start
+			results.update(cpu=(cpu_seconds(biobox.pid) - cpu_before) / elapsed * 100, messages=len(Mock.received) / elapsed,
+				p50=percentile(first, 50), p99=percentile(first, 99), matched=len(first))
+			print("duck: fully ducked p50 %.2fms p99 %.2fms over %d steps" % (percentile(full, 50), percentile(full, 99), len(full)))
+			return results
+		drops.clear()
+		Mock.vlc_connects.clear()
+		load = asyncio.create_task(background_load(scenario, tab_port))
+		cpu_before = cpu_seconds(biobox.pid)
+		Mock.received.clear()
+		sent_at = { } # (backend, value) to the time it was last sent
+		sent = [] # (time, value) for every step of the drag, the same on every channel
+		start = time.perf_counter()
+		step = 0
+		while time.perf_counter() < start + seconds:
+			step += 1
+			value = abs(step % 200 - 100) # Sawtooth, whole numbers so VLC can't round them
+			now = time.perf_counter()
+			for name in vlc_instances:
+				transport.sendto(OSC.encode("/channel/%s/volume" % name, float(value)))
+				sent_at[name, value] = now
+			transport.sendto(OSC.encode("/channel/Mic/volume", float(value)))
+			sent_at["Mic", value] = now
+			sent.append((now, value))
+			await asyncio.sleep(1 / 60)
+		await asyncio.sleep(0.5) # Let stragglers arrive
+		elapsed = time.perf_counter() - start
+		results["cpu"] = (cpu_seconds(biobox.pid) - cpu_before) / elapsed * 100
+		load.cancel()
+		latencies = []
+		for when, backend, msg in Mock.received:
+			for name, value in decode(backend, msg):
+				if (name, value) in sent_at and when > sent_at[name, value]:
+					latencies.append(when - sent_at[name, value])
+		results.update(messages=len(Mock.received) / elapsed, p50=percentile(latencies, 50), p99=percentile(latencies, 99), matched=len(latencies))
+		if scenario == "drag":
+			print("drag: %d redundant round trips" % redundant_trips(controller.volumes, sent, set(vlc_instances) | {"Mic"}))
+		if drops:
+			back = [min((when for when in Mock.vlc_connects if when > drop), default=math.inf) - drop for drop in drops]
+			print("reconnect: back p50 %.2fms max %.2fms after %d drops, %d never came back" % (
+				percentile([t for t in back if t < math.inf], 50), percentile([t for t in back if t < math.inf], 100),
+				len(drops), sum(t == math.inf for t in back)))
+	finally:
+		if pulse:
+			await pulse_cleanup(pulse)
+		transport.close()
+		if biobox.returncode is None:
+			biobox.terminate()
+			await biobox.wait()
+		for task in mocks:
+			task.cancel()
+		await asyncio.gather(*mocks, return_exceptions=True)
+		Mock.tracking = False
+		Mock.scenes["Main"] = main_scene
+		if pulse:
+			log.close()
+		shutil.rmtree(tmp, ignore_errors=True)
+	return results
+
+def redundant_trips(volumes, sent, names):
+	# OSC feedback during a drag should only ever show what we sent, give or
+	# take the last step not having got there yet. Anything else is a backend
+	# echo that BioBox took for a change and pulled the fader back to.
+	times = [when for when, value in sent]
+	count = 0
+	for when, name, volume in volumes:
+		i = bisect.bisect(times, when)
+		if name not in names or not 0 < i < len(times):
+			continue # Not dragged, or outside the drag
+		if all(abs(volume - value) > 1 for when, value in sent[max(i - 2, 0):i]):
+			count += 1
+	return count
+
+def decode(backend, msg):
+	# What channel values does this message to a mock carry?
+	if backend.startswith("VLC"):
+		cmd, *args = msg.decode("utf-8").split()
+		if cmd == "volume" and args:
+			yield backend, int(args[0])
+	elif backend == "obs":
+		import json
+		request = json.loads(msg)
+		for req in request.get("requests", [request]):
+			if req.get("request-type") == "SetVolume" and req["source"] == "Mic":
+				yield "Mic", round(math.sqrt(req["volume"]) * 100)
+
+async def warm_start(port=BASE_PORT):
+	vlc_instances = {"VLC": ("127.0.0.1", port)}
+	obs_port, meter_port, osc_port = port + 20, port + 21, port + 22
+	tmp = tempfile.mkdtemp(prefix="biobox-bench-")
+	with open(os.path.join(tmp, "config.py"), "w") as f:
+		f.write(CONFIG.format(vlc_port=port, vlc_instances=vlc_instances, python=sys.executable,
+			mock=os.path.join(HERE, "Mock.py"), obs_port=obs_port, meter_port=meter_port, osc_port=osc_port,
+			groups={}, ducking=None))
+	mocks = [asyncio.create_task(Mock.vlc(port, name="VLC")), asyncio.create_task(Mock.obs(obs_port))]
+	await asyncio.sleep(0.2)
+	env = dict(os.environ, BIOBOX_CONFIG=os.path.join(tmp, "config.py"), PYTHONUNBUFFERED="1",
+		MOCK_LATENCY=str(Mock.latency), MOCK_JITTER=str(Mock.jitter))
+	times = { }
+	try:
+		for kind in ("cold", "warm"):
+			launched = time.perf_counter()
+			biobox = await asyncio.create_subprocess_exec(sys.executable, os.path.join(HERE, "BioBox.py"),
+				cwd=tmp, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+			try:
+				while True:
+					line = await asyncio.wait_for(biobox.stdout.readline(), 20)
+					if not line:
+						raise RuntimeError("BioBox exited before the fader was in place")
+					if b"Fader in place" in line:
+						times[kind] = time.perf_counter() - launched
+						break
+				# Keep reading, so it never blocks on a full pipe, while the
+				# cache gets written (two seconds after the last change)
+				drain = asyncio.create_task(biobox.stdout.read())
+				await asyncio.sleep(3)
+				drain.cancel()
+			except asyncio.TimeoutError:
+				raise RuntimeError("Fader never got into place on the %s start" % kind)
+			finally:
+				if biobox.returncode is None:
+					biobox.terminate()
+					await biobox.wait()
+			if not os.path.exists(os.path.join(tmp, "state_cache.json")):
+				raise RuntimeError("No state cache written after the %s start" % kind)
+	finally:
+		for task in mocks:
+			task.cancel()
+		await asyncio.gather(*mocks, return_exceptions=True)
+		shutil.rmtree(tmp, ignore_errors=True)
+	return times
+
+async def duck_steps(seconds):
+	# Step the trigger from silence to -6dB and back, leaving time to duck and
+	# recover each way. Returns the latencies from each step up until the first
+	# ducked write reached OBS, and until the write at the full depth did.
+	global trigger_peak
+	Mock.received.clear()
+	steps = []
+	start = time.perf_counter()
+	while time.perf_counter() < start + seconds:
+		trigger_peak = 0.001
+		await asyncio.sleep(1.5)
+		steps.append(time.perf_counter())
+		trigger_peak = 0.5
+		await asyncio.sleep(1.5)
+	trigger_peak = 0.001
+	import json
+	floor = 10 ** (DUCKING["depth"] / 20) * 1.02
+	writes = [] # (time, volume) sent to the target
+	for when, backend, msg in Mock.received:
+		if backend != "obs": continue
+		request = json.loads(msg)
+		for req in request.get("requests", [request]):
+			if req.get("request-type") == "SetVolume" and req["source"] in DUCKING["targets"]:
+				writes.append((when, req["volume"]))
+	first, full = [], []
+	for n, step in enumerate(steps):
+		end = steps[n + 1] if n + 1 < len(steps) else math.inf
+		after = [(when, volume) for when, volume in writes if step < when < end]
+		ducked = [when for when, volume in after if volume < 0.99]
+		if ducked:
+			first.append(ducked[0] - step)
+		floored = [when for when, volume in after if volume <= floor]
+		if floored:
+			full.append(floored[0] - step)
+	return first, full
+
+async def group_moves(transport, members, seconds):
+	# Move the group master at 60 moves a second; a move counts once one
+	# message to OBS carries it to every member. The master sends at most
+	# write_interval apart, so about half the moves get overtaken and never
+	# go out at all. Returns the latencies and the number of OBS messages.
+	Mock.received.clear()
+	sent_at = { } # Value to the time the master was sent it
+	start = time.perf_counter()
+	step = 0
+	while time.perf_counter() < start + seconds:
+		step += 1
+		value = abs(step % 200 - 100)
+		sent_at[value] = time.perf_counter()
+		transport.sendto(OSC.encode("/channel/Bench/volume", float(value)))
+		await asyncio.sleep(1 / 60)
+	await asyncio.sleep(0.5) # Let stragglers arrive
+	latencies = []
+	import json
+	for when, backend, msg in Mock.received:
+		if backend != "obs": continue
+		request = json.loads(msg)
+		values = [round(math.sqrt(req["volume"]) * 100) for req in request.get("requests", [request])
+			if req.get("request-type") == "SetVolume" and req["source"] in members]
+		if len(values) == len(members) and len(set(values)) == 1:
+			value = values[0]
+			if value in sent_at and when > sent_at[value]:
+				latencies.append(when - sent_at[value])
+	return latencies, len(Mock.received)
+
+async def pulse_streams(count):
+	# A null sink with count silent streams playing into it. Each gets its own
+	# application name, which is what BioBox calls the channel, so that the
+	# OSC feedback can tell them apart.
+	proc = await asyncio.create_subprocess_exec("pactl", "load-module", "module-null-sink", "sink_name=biobox_bench",
+		stdout=subprocess.PIPE)
+	module = (await proc.communicate())[0].decode().strip()
+	if proc.returncode:
+		raise RuntimeError("Couldn't load a null sink - is PulseAudio or PipeWire running?")
+	names = ["Bench_%02d" % n for n in range(count)]
+	players = {name: await pulse_player(name) for name in names}
+	await asyncio.sleep(0.5)
+	import pulsectl
+	pa = pulsectl.Pulse("BioBox bench")
+	pulse = {"module": module, "players": players, "pa": pa, "streams": { }}
+	pulse_lookup(pulse)
+	return pulse
+
+def pulse_player(name):
+	return asyncio.create_subprocess_exec("pacat", "--playback", "--device=biobox_bench",
+		"--client-name=BioBox bench", "--property=application.name=" + name, "/dev/zero",
+		stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def pulse_lookup(pulse):
+	# Pick up the sink inputs of any players that have started since last time
+	for info in pulse["pa"].sink_input_list():
+		name = info.proplist.get("application.name")
+		if name in pulse["players"]:
+			pulse["streams"][name] = info
+
+async def pulse_changes(pulse, controller, seconds):
+	# Change one stream's volume every frame, round robin, and time each one
+	# until BioBox's OSC feedback shows that stream at the new level. Five
+	# times a second, one stream stops and a new one (under a new name, so
+	# that its channel can be told from the old one's) starts in its place,
+	# timed until BioBox reports a channel for it.
+	sent_at = { } # (channel name, volume) to the time it was set
+	started = { } # New stream name to the time its player was started
+	start = time.perf_counter()
+	step = replaced = 0
+	while time.perf_counter() < start + seconds:
+		if step % 12 == 11:
+			gone = random.choice(list(pulse["players"]))
+			player = pulse["players"].pop(gone)
+			pulse["streams"].pop(gone, None)
+			player.terminate()
+			await player.wait()
+			replaced += 1
+			name = "Bench_new_%03d" % replaced
+			started[name] = time.perf_counter()
+			pulse["players"][name] = await pulse_player(name)
+			pulse_lookup(pulse)
+		streams = sorted(pulse["streams"].items())
+		name, info = streams[step % len(streams)]
+		value = 20 + step // len(streams) % 60 # Whole percentages, different each time round
+		sent_at[name, value] = time.perf_counter()
+		try:
+			pulse["pa"].volume_set_all_chans(info, value / 100)
+		except Exception:
+			pass # Stream went away under us; nothing to time
+		step += 1
+		await asyncio.sleep(1 / 60)
+	await asyncio.sleep(0.5) # Let stragglers arrive
+	latencies = []
+	for when, name, volume in controller.volumes:
+		sent = sent_at.pop((name, round(volume)), None)
+		if sent is not None and when > sent:
+			latencies.append(when - sent)
+	appeared = [controller.seen[name] - when for name, when in started.items() if name in controller.seen]
+	return latencies, appeared
+
+async def pulse_cleanup(pulse):
+	pulse["pa"].close()
+	for player in pulse["players"].values():
+		if player.returncode is None:
+			player.terminate()
+			await player.wait()
+	proc = await asyncio.create_subprocess_exec("pactl", "unload-module", pulse["module"])
+	await proc.wait()
+
+async def background_load(scenario, tab_port):
+	if scenario == "scenes":
+		while True:
+			for scene in Mock.scenes:
+				await asyncio.sleep(0.5)
+				Mock.obs_switch_scene(scene)
+	elif scenario == "tabs":
+		async def storm():
+			while True:
+				try:
+					await Mock.tab("ws://127.0.0.1:%d/ws" % tab_port, lifetime=random.uniform(0.2, 1.0))
+				except OSError:
+					await asyncio.sleep(0.1)
+		await asyncio.gather(*[storm() for _ in range(20)])
+	elif scenario == "reconnect":
+		while True:
+			await asyncio.sleep(2)
+			drops.append(time.perf_counter())
+			Mock.vlc_drop_all()
+	else:
+		await asyncio.Future()
+
+def main():
+	parser = argparse.ArgumentParser(description="BioBox end-to-end benchmark")
+	parser.add_argument("scenarios", nargs="*", default=["drag", "scenes", "tabs", "reconnect", "vlc10", "warmstart", "duck", "group2", "group10", "group50"])
+	parser.add_argument("--seconds", type=float, default=10)
+	parser.add_argument("--latency", type=float, default=0, help="Milliseconds the mocks add to every reply")
+	parser.add_argument("--jitter", type=float, default=0, help="Milliseconds of random variation on that")
+	args = parser.parse_args()
+	Mock.latency, Mock.jitter = args.latency / 1000, args.jitter / 1000
+	xvfb = None
+	if not os.environ.get("DISPLAY"):
+		xvfb = subprocess.Popen(["Xvfb", ":97"], stderr=subprocess.DEVNULL)
+		os.environ["DISPLAY"] = ":97"
+		time.sleep(1)
+	try:
+		print("%-10s %8s %9s %9s %9s %8s %7s" % ("scenario", "startup", "msg/s", "p50 ms", "p99 ms", "matched", "cpu %"))
+		for scenario in args.scenarios:
+			try:
+				if scenario == "warmstart":
+					r = asyncio.run(warm_start())
+					print("%-10s cold %.2fs, warm %.2fs from launch until the fader is in place" % (scenario, r["cold"], r["warm"]))
+					continue
+				r = asyncio.run(run(scenario, args.seconds))
+			except RuntimeError as e:
+				print("%-10s failed: %s" % (scenario, e))
+				continue
+			print("%-10s %7.2fs %9.1f %9.2f %9.2f %8d %7.1f" % (scenario, r["startup"], r["messages"], r["p50"], r["p99"], r["matched"], r["cpu"]))
+	finally:
+		if xvfb:
+			xvfb.terminate()
+
+if __name__ == "__main__":
+	main()
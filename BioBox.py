@@ -1,41 +1,73 @@
 import os
 import sys
+import signal
+import argparse
 import time
 import subprocess
 import asyncio
 from asyncio import create_task
 import WebSocket # Local library for connecting to browser extension
+import Automation
+import Limiter
+import Ducking
+import Meters
+import OSC
+import WebControl
+import Recorder
+import Profiler
+import Pager
+import Governor
 import websockets # ImportError? pip install websockets
 import json
+import re
 
 
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Gdk, GLib
+from gi.repository import Gtk, Gdk, GLib, Gio
 
-import gbulb
-gbulb.install(gtk=True)
+try:
+	# PyGObject 3.50+ runs asyncio directly on the GLib main loop
+	from gi.events import GLibEventLoopPolicy
+	asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+except ImportError: # Older python3-gi from the package manager: pip install gbulb
+	import gbulb
+	gbulb.install(gtk=True)
 
 try:
 	import Analog
 	from Motor import cleanup as motor_cleanup
-except (ImportError, NotImplementedError): # Provide a dummy for testing
+except (ImportError, NotImplementedError): # No hardware: simulate it, for testing
 	def motor_cleanup():
 		pass
-	class Analog():
-		goal = None
-		async def read_value():
-			yield 0 # Yield once and then stop
-			# Just as a function is destined to yield once, and then face termination...
-			# TODO: instead of creating dummy function, disable slider task on startup
+	import SimAnalog as Analog
+
+try:
+	import pulsectl
+	import pulsectl_asyncio
+except ImportError: # pip install pulsectl-asyncio for the PulseAudio module
+	pulsectl_asyncio = None
 
-import config # ImportError? See config_example.py
+import importlib.util
+import types
+if "BIOBOX_CONFIG" in os.environ: # Somewhere else, eg from the benchmark harness
+	spec = importlib.util.spec_from_file_location("config", os.environ["BIOBOX_CONFIG"])
+	config = sys.modules["config"] = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(config)
+else:
+	import config # ImportError? See config_example.py
 
 selected_channel = None
-slider_last_wrote = time.monotonic() + 0.5
+obs = None # The OBS websocket, while connected
 webcams = {}
+vlc_instances = {}
 tabs = {}
 obs_sources = {}
+pulse_channels = {}
+pulse_costs = {"created": [], "removed": []} # Seconds spent making or tearing down each PulseAudio channel
+groups = {}
+pulse_facilities = ('sink', 'source', 'sink_input')
+VLC_RETRY_MIN, VLC_RETRY_MAX = 0.25, 10.0 # Seconds between TellMeVLC reconnection attempts
 source_types = ['browser_source', 'pulse_input_capture', 'pulse_output_capture']
 # TODO: Configure OBS modules within BioBox
 
@@ -46,6 +78,19 @@ UI_HEADER = """
 """
 UI_FOOTER = """
 		</menu>
+		<menu action='AutomationMenu'>
+			<menuitem action='FadeSelected' />
+		</menu>
+		<menu action='SnapshotsMenu'>
+			<menuitem action='SnapshotSave' />
+			<menuitem action='SnapshotRecall' />
+		</menu>
+		<menu action='NavigateMenu'>
+			<menuitem action='PagePrev' />
+			<menuitem action='PageNext' />
+			<menuitem action='ChannelPrev' />
+			<menuitem action='ChannelNext' />
+		</menu>
 	</menubar>
 </ui>
 """
@@ -55,18 +100,50 @@ def report(msg):
 
 # Slider
 async def read_analog():
-	global slider_last_wrote
 	# Get analog value from Analog.py and write to selected channel's slider
 	async for volume in Analog.read_value():
-		if selected_channel:
+		Recorder.sample(volume)
+		if selected_channel and pager.accept():
 			print("From slider:", volume)
 			# TODO: Scale 0-100% to 0-150%
 			selected_channel.refract_value(volume, "analog")
-			slider_last_wrote = time.monotonic()
 			# TODO: Investigate desync when quickly scrolling on slider:
 			# Suspect issue is caused by dropping new goals too soon after
 			# setting a previous one, but may require complex queue/expiry system
 
+def seek_fader(value):
+	# The motor always chases the latest goal, so there's no need to hold
+	# back goals that come in quick succession.
+	Analog.goal = value
+	Recorder.goal(value)
+	print("Slider goal: %s" % Analog.goal)
+
+def find_channel(key):
+	for channel in all_channels():
+		if channel.key == key:
+			return channel
+
+def fader_position(key):
+	channel = find_channel(key)
+	return channel.slider.get_value() if channel else 0
+
+def choose_channel(key):
+	channel = find_channel(key)
+	if channel:
+		channel.selector.set_active(True)
+
+pager = Pager.Pager(channels=lambda: [c.key for c in all_channels() if not isinstance(c, Cached)],
+	value=fader_position, seek=seek_fader, choose=choose_channel, page_size=getattr(config, "page_size", 4))
+fader_at = None # Where the motor last left the fader
+
+def fader_arrived(position):
+	global fader_at
+	fader_at = position
+	pager.arrived(position)
+	check_startup_position()
+
+Analog.goal_done = fader_arrived
+
 def init_motor_pos():
 	if selected_channel:
 		Analog.goal = selected_channel.slider.get_value()
@@ -74,48 +151,97 @@ def init_motor_pos():
 		Analog.goal = 100
 
 # VLC
+def vlc_endpoints():
+	# Every TellMeVLC instance gets its own channel. Older configs only name
+	# a single instance on the main host, so fall back to that.
+	return getattr(config, "vlc_instances", None) or {"VLC": (config.host, config.vlc_port)}
+
 async def vlc(stop):
+	# Connect to all instances at once, so ten of them take no longer than one.
+	# Each connection lives and dies on its own; one failing leaves the rest.
+	await asyncio.gather(*[vlc_instance(name, host, port, stop)
+		for name, (host, port) in vlc_endpoints().items()])
+
+async def vlc_instance(name, host, port, stop):
+	# Stay connected to one TellMeVLC instance until stopped. When the
+	# connection drops, or can't be made, try again after a delay that doubles
+	# each time up to VLC_RETRY_MAX. The channel stays (greyed out) meanwhile,
+	# so it keeps its place and its selection.
 	vlc_module = None
+	delay = VLC_RETRY_MIN
 	try:
-		reader, writer = await asyncio.open_connection(config.host, config.vlc_port)
-		writer.write(b"volume\r\nmuted\r\n") # Ask volume and mute state
-		await writer.drain()
-		vlc_module = VLC(writer)
-		await vlc_buf_read(vlc_module, reader, stop)
-	except ConnectionRefusedError:
-		print("Could not connect to VLC on %s:%s - is TMV running?" % (config.host, config.vlc_port))
-	except asyncio.CancelledError:
-		#writer.close() # Not sure what will be needed here but revisit when stop event is removed
-		raise
+		while not stop.is_set():
+			writer = None
+			try:
+				reader, writer = await asyncio.open_connection(host, port)
+				writer.write(b"volume\r\nmuted\r\n") # Ask volume and mute state
+				await writer.drain()
+				if vlc_module:
+					vlc_module.writer = writer
+					vlc_module.set_sensitive(True)
+					report("%s reconnected" % name)
+				else:
+					vlc_module = vlc_instances[name] = VLC(name, writer)
+				delay = VLC_RETRY_MIN
+				async for line in read_lines(reader, stop):
+					Recorder.inbound(name, line)
+					attr, sep, value = line.partition(":")
+					if attr == "volume":
+						vlc_module.refract_value(float(value), "backend")
+					elif attr == "muted":
+						vlc_module.mute.set_active(int(value))
+					else:
+						print("From %s:" % name, attr, value)
+			except OSError as e:
+				print("Could not connect to %s on %s:%s - is TMV running?" % (name, host, port), e)
+			finally:
+				if writer:
+					writer.close()
+					try:
+						await writer.wait_closed()
+					except OSError:
+						pass # Already gone, which is what we wanted anyway
+			if stop.is_set():
+				break
+			if vlc_module:
+				vlc_module.writer = None
+				vlc_module.set_sensitive(False)
+			try:
+				await asyncio.wait_for(stop.wait(), delay)
+			except asyncio.TimeoutError:
+				pass
+			delay = min(delay * 2, VLC_RETRY_MAX)
 	finally:
 		if vlc_module:
 			vlc_module.remove()
-			writer.close() # Close connection and remove module
-			await writer.wait_closed()
-		print("VLC cleanup done")
-
-async def vlc_buf_read(vlc_module, reader, stop):
-	while True:
-		done, pending = await asyncio.wait([create_task(reader.readline()), create_task(stop.wait())], return_when=asyncio.FIRST_COMPLETED)
-		#line = await reader.readline()
-		if stop.is_set():
-			break
-		try:
-			data = next(iter(done)).result()
+			vlc_instances.pop(name, None)
+		print(name, "cleanup done")
+
+async def read_lines(reader, stop):
+	# Shared framing for the line-based backends (TellMeVLC and the webcam
+	# controller over ssh): yield each decoded line until the stream ends,
+	# errors out, or the stop event fires.
+	stopper = create_task(stop.wait())
+	line = None
+	try:
+		while True:
+			line = create_task(reader.readline())
+			await asyncio.wait([line, stopper], return_when=asyncio.FIRST_COMPLETED)
+			if stop.is_set():
+				break
+			try:
+				data = line.result()
+			except Exception as e:
+				print(type(e))
+				print(e)
+				break
 			if not data:
 				break
-		except BaseException as e:
-			print(type(e))
-			print(e)
-			break
-		line = data.decode("utf-8")
-		attr, value = line.split(":", 1)
-		if attr == "volume":
-			vlc_module.refract_value(float(value), "backend")
-		elif attr == "muted":
-			vlc_module.mute.set_active(int(value))
-		else:
-			print("From VLC:", attr, value)
+			yield data.decode("utf-8")
+	finally:
+		stopper.cancel()
+		if line:
+			line.cancel()
 
 # Webcam
 async def webcam(stop):
@@ -129,27 +255,16 @@ async def webcam(stop):
 			ssh.terminate()
 	try:
 		# Begin cancellable section
-		ssh = await asyncio.create_subprocess_exec("ssh", "-oBatchMode=yes", (config.webcam_user + "@" + config.host), "python3", config.webcam_control_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+		command = getattr(config, "webcam_command", None) or ["ssh", "-oBatchMode=yes", (config.webcam_user + "@" + config.host), "python3", config.webcam_control_path]
+		ssh = await asyncio.create_subprocess_exec(*command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
 		# TODO: Deal with authentication if client and host have not set up key auth
 		# TODO: Handle connection failures
 		# Testing/simulating connection issues is difficult as simply killing
 		# the ssh process causes the window contents to stop drawing (while
 		# remaining fully functional, as far as makes sense)
-		while True:
-			try:
-				done, pending = await asyncio.wait([create_task(ssh.stdout.readline()), create_task(stop.wait()), create_task(ssh.wait())], return_when=asyncio.FIRST_COMPLETED)
-			except ConnectionResetError:
-				print("SSH connection lost")
-				break
-			if ssh.returncode is not None or stop.is_set():
-				break
-			try:
-				data = next(iter(done)).result()
-			except BaseException as e:
-				print(type(e))
-				print(e)
-				break
-			line = data.decode("utf-8")
+		# If ssh exits, its stdout ends, and so does this loop
+		async for line in read_lines(ssh.stdout, stop):
+			Recorder.inbound("webcam", line)
 			device, sep, attr = line.rstrip().partition(": ")
 			if sep:
 				if device == "Unknown command":
@@ -167,10 +282,11 @@ async def webcam(stop):
 					if not sep:
 						continue
 					if cmd == "set_range":
-						min, max, step = map(int, value.split())
-						webcams[device].slider.set_lower(min)
-						webcams[device].slider.set_upper(max)
+						lo, hi, step = map(int, value.split())
+						webcams[device].slider.set_lower(lo)
+						webcams[device].slider.set_upper(hi)
 						webcams[device].slider.set_page_increment(step)
+						webcams[device].echo_tolerance = max(step, 1) # v4l2 rounds to the step
 					elif cmd == "focus_absolute":
 						webcams[device].refract_value(int(value), "backend")
 					elif cmd == "focus_auto":
@@ -210,6 +326,7 @@ async def obs_ws(stop):
 					print(type(e))
 					print(e)
 					break
+				Recorder.inbound("obs", data)
 				msg = json.loads(data)
 				collector = {}
 				if msg.get("update-type") == "SourceVolumeChanged":
@@ -233,13 +350,78 @@ async def obs_ws(stop):
 		if e.errno != 111: raise
 		# Ignore connection-refused and just let the module get cleaned up
 	finally:
+		obs = None
 		for source in obs_sources.values():
 			source.remove()
 		obs_sources.clear()
 		print("OBS cleanup done")
 
+async def obs_tasks(stop):
+	await asyncio.gather(obs_ws(stop), obs_meters(stop))
+
+async def obs_meters(stop):
+	# Volume meters only exist in the v5 protocol (OBS 28+), so they come over
+	# a second connection that subscribes to nothing else.
+	port = getattr(config, "obs_meter_port", None)
+	if not port:
+		return
+	duck = getattr(config, "ducking", None)
+	ducker = duck and Ducking.Ducker(**duck)
+	try:
+		async with websockets.connect("ws://%s:%d" % (config.host, port)) as sock:
+			hello = json.loads(await sock.recv())
+			if hello["d"].get("authentication"):
+				print("OBS meters need authentication, which isn't supported yet")
+				return
+			await sock.send(json.dumps({"op": 1, "d": {"rpcVersion": 1, "eventSubscriptions": 1 << 16}})) # InputVolumeMeters
+			async for data in sock:
+				Recorder.inbound("obs-meters", data)
+				msg = json.loads(data)
+				if msg["op"] != 5 or msg["d"]["eventType"] != "InputVolumeMeters":
+					continue
+				for source in msg["d"]["eventData"]["inputs"]:
+					levels = source["inputLevelsMul"]
+					if source["inputName"] in obs_sources and levels:
+						meters.update(obs_sources[source["inputName"]], max(chan[1] for chan in levels), max(chan[0] for chan in levels))
+					if ducker and source["inputName"] == ducker.trigger:
+						gain = ducker.update(source["inputLevelsMul"])
+						if gain is not None:
+							for channel in all_channels():
+								if ducker.is_target(channel):
+									channel.set_duck(gain)
+	except websockets.exceptions.ConnectionClosed:
+		report("OBS meter connection lost")
+	except OSError as e:
+		if e.errno != 111: raise
+	finally:
+		if ducker:
+			for channel in all_channels():
+				channel.set_duck(1.0)
+
+obs_queue = []
 def obs_send(request):
-	asyncio.run_coroutine_threadsafe(obs.send(json.dumps(request)), loop)
+	# Everything sent within one pass of the event loop goes out together as
+	# a single ExecuteBatch, so a group move touching many sources costs one
+	# message rather than one per source.
+	obs_queue.append(request)
+	if len(obs_queue) == 1:
+		asyncio.get_running_loop().call_soon(obs_flush)
+
+def obs_flush():
+	if len(obs_queue) == 1:
+		request = obs_queue[0]
+	else:
+		request = {"request-type": "ExecuteBatch", "message-id": "batch", "requests": obs_queue[:]}
+	obs_queue.clear()
+	if obs is None or obs.closed:
+		return # Not connected (yet, or any more); the source list will be fetched afresh
+	request = json.dumps(request)
+	Recorder.outbound("obs", request)
+	asyncio.create_task(obs.send(request)).add_done_callback(obs_sent)
+
+def obs_sent(task):
+	if not task.cancelled() and task.exception():
+		print("Couldn't send to OBS:", task.exception())
 
 def list_scene_sources(sources, collector):
 	for source in sources:
@@ -254,6 +436,85 @@ def list_scene_sources(sources, collector):
 			#TODO: get this scene's sources and recurse
 			pass
 
+# PulseAudio (also works with PipeWire's pulse server)
+async def pulse(stop):
+	if not pulsectl_asyncio:
+		print("PulseAudio module needs pulsectl-asyncio - pip install pulsectl-asyncio")
+		return
+	refreshing = {}
+	async def report_costs():
+		# Streams come and go all the time; every so often, say what that costs
+		reported = None
+		while True:
+			await asyncio.sleep(5)
+			counts = [len(times) for times in pulse_costs.values()]
+			if counts != reported:
+				reported = counts
+				report("PulseAudio channels: " + pulse_cost_summary())
+	reporter = create_task(report_costs())
+	async def refresh(pa, facility, index):
+		try:
+			info = await getattr(pa, facility + "_info")(index)
+		except pulsectl.PulseIndexError:
+			return # Gone again before we got to it; a remove event will follow
+		finally:
+			refreshing.pop((facility, index), None)
+		pulse_update(pa, facility, info)
+	try:
+		async with pulsectl_asyncio.PulseAsync("BioBox") as pa:
+			for facility in pulse_facilities:
+				for info in await getattr(pa, facility + "_list")():
+					pulse_update(pa, facility, info)
+			async for event in pa.subscribe_events(*pulse_facilities):
+				Recorder.inbound("pulse", event)
+				facility = next(f for f in pulse_facilities if event.facility == f)
+				key = (facility, event.index)
+				if event.t == "remove":
+					channel = pulse_channels.pop(key, None)
+					if channel:
+						began = time.perf_counter()
+						channel.remove()
+						pulse_costs["removed"].append(time.perf_counter() - began)
+				elif key not in refreshing:
+					# Streams send bursts of change events; one lookup covers them all
+					refreshing[key] = create_task(refresh(pa, facility, event.index))
+	except pulsectl.PulseError as e:
+		print("Could not talk to PulseAudio:", e)
+	finally:
+		reporter.cancel()
+		for task in refreshing.values():
+			task.cancel()
+		for channel in pulse_channels.values():
+			channel.remove()
+		pulse_channels.clear()
+		print("PulseAudio cleanup done")
+
+def pulse_update(pa, facility, info):
+	if facility == "source" and info.name.endswith(".monitor"):
+		return # Every sink has one of these, and they're just clutter
+	channel = pulse_channels.get((facility, info.index))
+	if channel:
+		channel.update(info)
+	else:
+		began = time.perf_counter()
+		pulse_channels[facility, info.index] = PulseAudio(pa, facility, info)
+		pulse_costs["created"].append(time.perf_counter() - began)
+
+def pulse_cost_summary():
+	return ", ".join("%d %s (mean %.2fms, max %.2fms)" % (len(times), what, sum(times) / len(times) * 1000, max(times) * 1000)
+		if times else "none %s" % what for what, times in pulse_costs.items())
+
+# Linked groups
+async def linked_groups(stop):
+	for name, members in getattr(config, "channel_groups", {}).items():
+		groups[name] = Group(name, members)
+	try:
+		await stop.wait()
+	finally:
+		for group in groups.values():
+			group.remove()
+		groups.clear()
+
 # Browser
 def new_tab(tabid):
 	# TODO: Some browser media, including YouTube, reports volume to
@@ -262,23 +523,368 @@ def new_tab(tabid):
 	# sites in order to separate the ones which require scaling and
 	# the ones which don't?
 	print("Creating channel for new tab:", tabid)
+	Recorder.inbound("browser", "connected " + tabid)
 	newtab = Browser(tabid)
 	tabs[tabid] = newtab
 
 def closed_tab(tabid):
 	print("Destroying channel for closed tab:", tabid)
+	Recorder.inbound("browser", "disconnected " + tabid)
 	tabs[tabid].remove()
 	tabs.pop(tabid, None)
 
+def tab_levels(tabid, peak, rms):
+	if tabid in tabs:
+		meters.update(tabs[tabid], peak, rms)
+
 def tab_volume_changed(tabid, volume, mute_state):
 	print("On", tabid, ": Volume:", volume, "Muted:", bool(mute_state))
+	Recorder.inbound("browser", "setvolume %s %s %d" % (tabid, volume, mute_state))
 	channel = tabs[tabid]
 	channel.refract_value(float(volume * 100), "backend")
 	channel.mute.set_active(int(mute_state))
 
+# State cache
+# Last-known channels, values and mute states, so the window and the motor are
+# right from the moment BioBox starts, rather than only once every backend has
+# connected and reported in. Cached channels stand in, greyed out, until the
+# real channel turns up and takes over their place.
+watchers = [] # Called with each channel whose state changes
+placeholders = {}
+state_cache = {}
+cache_writer = None
+launch_time = time.monotonic()
+awaiting_position = True
+start_kind = "cold" # Or "warm", once a usable cache has been read
+
+def notify(channel):
+	for watcher in watchers:
+		watcher(channel)
+
+def cache_path():
+	return getattr(config, "state_cache", "state_cache.json")
+
+def restore_state_cache():
+	global start_kind
+	try:
+		with open(cache_path()) as f:
+			state = json.load(f)
+		channels = [(str(key), str(category), str(name), float(value), bool(muted))
+			for key, category, name, value, muted in state["channels"]]
+		selected = str(state.get("selected"))
+	except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+		report("No usable state cache, starting cold")
+		return False
+	start_kind = "warm"
+	categories = {category.__name__: category for category in Channel.__subclasses__()}
+	for key, category, name, value, muted in channels:
+		if category in categories and category != "Browser": # Older caches had tabs
+			state_cache[key] = value
+			placeholders[key] = cached_category(categories[category])(key, name, value, muted)
+	selected = placeholders.get(selected)
+	if selected:
+		selected.selector.set_active(True) # Sends the motor on its way
+		report("Fader pre-positioned from cache %.3fs after launch" % (time.monotonic() - launch_time))
+	asyncio.get_event_loop().call_later(getattr(config, "state_cache_grace", 10), drop_placeholders)
+	return selected is not None
+
+def check_startup_position():
+	# Startup is done once the motor has stopped where the live selected
+	# channel (not a stand-in for it) wants the fader
+	global awaiting_position
+	if not awaiting_position or fader_at is None or not selected_channel or isinstance(selected_channel, Cached):
+		return
+	if selected_channel.reports_back and not selected_channel.heard_from_backend:
+		return # Still showing the cached value, which may be out of date
+	if abs(fader_at - min(max(selected_channel.slider.get_value(), 0), 100)) <= Pager.TOLERANCE:
+		awaiting_position = False
+		report("Fader in place for live channel %s %.3fs after launch (%s start)" % (
+			selected_channel.channel_name, time.monotonic() - launch_time, start_kind))
+
+def drop_placeholders():
+	# Anything the backends haven't claimed by now isn't coming back
+	for placeholder in list(placeholders.values()):
+		placeholder.remove()
+	placeholders.clear()
+
+def cache_changed(channel):
+	global cache_writer
+	if cache_writer is None:
+		cache_writer = asyncio.get_event_loop().call_later(2, save_state_cache)
+
+def save_state_cache():
+	global cache_writer
+	if cache_writer:
+		cache_writer.cancel()
+		cache_writer = None
+	state = {
+		"selected": selected_channel and selected_channel.key,
+		# Tab IDs are new on every page load, so a cached tab would never be claimed
+		"channels": [[channel.key, channel.group.get_name(), channel.channel_name, channel.oldvalue, channel.mute.get_active()]
+			for channel in all_channels() if not isinstance(channel, Browser)],
+	}
+	with open(cache_path(), "w") as f:
+		json.dump(state, f, separators=(",", ":"))
+
+watchers.append(cache_changed)
+
+def group_link(channel):
+	# Let every linked group see each channel as it turns up or changes
+	for group in groups.values():
+		group.link(channel)
+
+watchers.append(group_link)
+
+class Cached():
+	# Mixed in ahead of a channel class to make a stand-in for it
+	def __init__(self, key, name, value, muted):
+		self.cached_key = key
+		Channel.__init__(self, name)
+		self.set_sensitive(False) # Nothing to control until the backend is here
+		self.mute.set_active(muted)
+
+	@property
+	def key(self):
+		return self.cached_key
+
+	reports_back = False
+
+	def write_external(self, value):
+		pass
+
+	def muted(self, widget):
+		return Channel.muted(self, widget)
+
+cached_categories = {}
+def cached_category(category):
+	if category not in cached_categories:
+		cached_categories[category] = type("Cached" + category.__name__, (Cached, category), {})
+	return cached_categories[category]
+
+# Replay
+async def replay(path, fast):
+	# Feed a recorded session back through the channels. Stand-ins take the
+	# place of the backends: what they would have been sent goes nowhere, but
+	# still counts. Backend reports come back as the refract_value calls they
+	# turned into, not as raw traffic; the inbound messages in the log are
+	# only there to read. Analog calls are left out, since the ADC samples
+	# regenerate them. Group members are replayed from their own records: a
+	# stand-in master doesn't fan out, as stand-ins send nothing anywhere.
+	categories = {category.__name__: category for category in Channel.__subclasses__()}
+	channels = {}
+	def channel(key):
+		if key not in channels:
+			category, sep, name = key.partition(":")
+			channels[key] = cached_category(categories.get(category, Dummy))(key, name, 100.0, False)
+		return channels[key]
+	timings = []
+	recorded_goals = 0
+	start = time.monotonic()
+	async for when, kind, fields in Recorder.replay(path, fast):
+		began = time.perf_counter()
+		if kind == Recorder.ADC:
+			if selected_channel:
+				selected_channel.refract_value(fields[0], "analog")
+		elif kind == Recorder.SELECT:
+			channel(fields[0]).selector.set_active(True)
+		elif kind == Recorder.REFRACT and fields[1] != "analog":
+			key, source, value = fields
+			channel(key).refract_value(value, source)
+		else:
+			recorded_goals += kind == Recorder.GOAL
+			continue
+		timings.append(time.perf_counter() - began)
+	elapsed = time.monotonic() - start
+	timings.sort()
+	if timings:
+		report("Replayed %d events in %.3fs (%d/s): per event p50 %.3fms p99 %.3fms; %d backend writes; %d motor goals recorded" % (
+			len(timings), elapsed, len(timings) / elapsed, timings[len(timings) // 2] * 1000, timings[len(timings) * 99 // 100] * 1000,
+			sum(chan.external_writes for chan in channels.values()), recorded_goals))
+
+# Snapshots
+def all_channels():
+	for category in Channel.__subclasses__():
+		if hasattr(category, "group"):
+			yield from category.group.get_children()
+
+def load_snapshots():
+	try:
+		with open(getattr(config, "snapshot_file", "snapshots.json")) as f:
+			return json.load(f)
+	except FileNotFoundError:
+		return {}
+	except ValueError as e:
+		report("Ignoring unreadable snapshot file: %s" % e)
+		return {}
+
+def save_snapshot(name):
+	snapshots = load_snapshots()
+	snapshots[name] = {chan.key: {"value": chan.oldvalue, "muted": chan.mute.get_active()} for chan in all_channels()}
+	with open(getattr(config, "snapshot_file", "snapshots.json"), "w") as f:
+		json.dump(snapshots, f, indent="\t")
+	report("Saved snapshot %r with %d channels" % (name, len(snapshots[name])))
+
+async def recall_snapshot(name):
+	# Send every channel its new state in one pass, without waiting between
+	# them, and only then wait for the backends to echo back. The whole recall
+	# thus costs one round trip, bounded by the deadline.
+	snapshot = load_snapshots()[name]
+	deadline = getattr(config, "snapshot_deadline", 1.0)
+	# A cached stand-in has no backend to send to or hear back from, so it
+	# can't be recalled; say so rather than claim it as confirmed.
+	channels = {chan.key: chan for chan in all_channels() if not isinstance(chan, Cached)}
+	stand_ins = [chan.key for chan in all_channels() if isinstance(chan, Cached) and chan.key in snapshot]
+	if selected_channel and selected_channel.key in channels and selected_channel.key in snapshot:
+		# The motor is by far the slowest thing to move, so start it first
+		selected_channel.write_analog(snapshot[selected_channel.key]["value"])
+	pending = {}
+	for key, state in snapshot.items():
+		if key in channels:
+			pending[key] = channels[key].recall(state["value"], state["muted"])
+	if pending:
+		await asyncio.wait(pending.values(), timeout=deadline)
+	unconfirmed = [key for key, confirmed in pending.items() if not confirmed.done()]
+	for key in unconfirmed:
+		pending[key].cancel()
+	missing = [key for key in snapshot if key not in channels and key not in stand_ins]
+	report("Recalled snapshot %r: %d confirmed, unconfirmed: %s, skipped (still cached): %s, not present: %s" % (
+		name, len(pending) - len(unconfirmed), ", ".join(unconfirmed) or "none",
+		", ".join(stand_ins) or "none", ", ".join(missing) or "none"))
+	return unconfirmed
+
+# OSC remote control
+def osc_name(channel):
+	# OSC addresses can't have spaces (among other things) in them
+	return re.sub(r"[^A-Za-z0-9_.-]", "_", channel.channel_name)
+
+def osc_channel(name):
+	for channel in all_channels():
+		if osc_name(channel) == name and not isinstance(channel, Cached):
+			return channel
+
+def osc_volume(name, value):
+	channel = osc_channel(name)
+	if channel:
+		channel.refract_value(min(max(float(value), 0.0), 150.0), "osc")
+
+def osc_mute(name, value):
+	channel = osc_channel(name)
+	if channel:
+		channel.mute.set_active(bool(value))
+
+def osc_subscribed(addr):
+	for channel in all_channels():
+		osc_changed(channel)
+
+def osc_other(address, args):
+	if address == "/profiler":
+		set_profiling(bool(args[0]) if args else not Profiler.active())
+	elif address in ("/page/next", "/page/prev"):
+		pager.flip_page(1 if address.endswith("next") else -1)
+	elif address in ("/channel/next", "/channel/prev"):
+		pager.step(1 if address.endswith("next") else -1)
+	elif address.startswith("/channel/") and address.endswith("/select"):
+		channel = osc_channel(address.split("/")[2])
+		if channel:
+			channel.selector.set_active(True)
+
+def osc_changed(channel):
+	OSC.publish(osc_name(channel), channel.oldvalue, channel.mute.get_active())
+
+watchers.append(osc_changed)
+
+# Profiling, toggled from the menu, SIGUSR1 or OSC /profiler
+profiler_action = None
+def set_profiling(state):
+	if state == Profiler.active():
+		return
+	if state:
+		Profiler.start()
+		report("Profiler started")
+	else:
+		report("Profile saved to %s" % Profiler.stop(getattr(config, "profile_dir", ".")))
+	if profiler_action:
+		profiler_action.set_active(state)
+
+def profiler_signal():
+	set_profiling(not Profiler.active())
+	return True # Keep listening for the signal
+
+# Config hot-reload
+def config_settings(module):
+	return {name: value for name, value in vars(module).items() if not name.startswith("_")
+		and not callable(value) and not isinstance(value, types.ModuleType)}
+
+def reload_config():
+	# Run the config file afresh, and only if that works, bring the live
+	# config module into line with it. Returns the names of the settings
+	# that changed, or None if the new file couldn't be used.
+	spec = importlib.util.spec_from_file_location("config", config.__file__)
+	fresh = importlib.util.module_from_spec(spec)
+	try:
+		spec.loader.exec_module(fresh)
+	except Exception as e: # Anything at all could be wrong with a half-edited file
+		report("Config reload failed, keeping the old one: %s: %s" % (type(e).__name__, e))
+		return None
+	old, new = config_settings(config), config_settings(fresh)
+	missing = object()
+	changed = {name for name in old.keys() | new.keys() if old.get(name, missing) != new.get(name, missing)}
+	for name in old.keys() - new.keys():
+		delattr(config, name)
+	for name, value in new.items():
+		setattr(config, name, value)
+	return changed
+
+live_timers = { } # Category name to (since, why) we're waiting for its first live channel
+def live_timer(channel):
+	category = type(channel).__name__
+	if category in live_timers and not isinstance(channel, Cached):
+		since, why = live_timers.pop(category)
+		report("%s live %.3fs after %s" % (category, time.monotonic() - since, why))
+
+watchers.append(live_timer)
+
+# Power governor: ease off when the Pi is under-voltage, throttled or hot
+def apply_governor(profile, settings):
+	Analog.sample_interval = 1 / settings["sample_hz"]
+	Analog.max_speed = settings["motor_ceiling"]
+	meters.max_fps = settings["meter_fps"]
+	WebControl.FRAME = 1 / settings["web_fps"]
+
+# Web control surface
+def web_changed(channel):
+	if channel.get_parent() is None:
+		WebControl.removed(channel.key)
+	else:
+		WebControl.update(channel.key, name=channel.channel_name, value=channel.oldvalue,
+			muted=channel.mute.get_active(), cached=isinstance(channel, Cached))
+	WebControl.set_selected(selected_channel and selected_channel.key)
+
+def web_channel(key):
+	for channel in all_channels():
+		if channel.key == key and not isinstance(channel, Cached):
+			return channel
+
+def web_setvolume(key, value):
+	channel = web_channel(key)
+	if channel and isinstance(value, (int, float)):
+		channel.refract_value(min(max(float(value), 0.0), 150.0), "web")
+
+def web_setmuted(key, value):
+	channel = web_channel(key)
+	if channel:
+		channel.mute.set_active(bool(value))
+
+def web_select(key, value):
+	channel = web_channel(key)
+	if channel:
+		channel.selector.set_active(True)
+
 class Channel(Gtk.Frame):
 	mute_labels = ("Mute", "Muted")
 	step = 0.01
+	confirming = None # (value, future) while a snapshot recall awaits the backend
+	echo_tolerance = 0.5 # How far a backend may round what we sent it
 
 	def __init__(self, name):
 		super().__init__(label=name, shadow_type=Gtk.ShadowType.ETCHED_IN)
@@ -291,7 +897,8 @@ class Channel(Gtk.Frame):
 		#channel_label = Gtk.Label(label=self.channel_name)
 		#box.pack_start(channel_label, False, False, 0)
 		# Slider stuff
-		self.oldvalue = 100.0
+		self.oldvalue = state_cache.get(self.key, 100.0)
+		self.limiter = Limiter.Limiter(self.write_external, self.write_interval, prepare=self.ducked)
 		self.slider = Gtk.Adjustment(value=self.oldvalue, lower=0.0, upper=150.0, step_increment=1.0, page_increment=1.0, page_size=0)
 		level = Gtk.Scale(orientation=Gtk.Orientation.VERTICAL, adjustment=self.slider, inverted=True, draw_value=False)
 		level.add_mark(value=100, position=Gtk.PositionType.LEFT, markup=None)
@@ -317,6 +924,14 @@ class Channel(Gtk.Frame):
 		# Add self to group
 		self.group.pack_start(self, True, True, 0)
 		self.group.show_all()
+		# Take over from the cached stand-in, if there is one
+		placeholder = placeholders.pop(self.key, None)
+		if placeholder:
+			self.group.reorder_child(self, self.group.get_children().index(placeholder))
+			if selected_channel is placeholder:
+				self.selector.set_active(True)
+			placeholder.remove()
+		notify(self)
 
 	def focus_delay(self, widget, direction):
 		GLib.idle_add(self.focus_select, widget)
@@ -342,15 +957,56 @@ class Channel(Gtk.Frame):
 		if widget.get_active():
 			selected_channel = self
 			print(selected_channel.channel_name, "selected")
-			self.write_analog(selected_channel.slider.get_value())
+			Recorder.select(self.key)
+			pager.select(self.key) # Seeks, and holds off fader input until it's there
+			notify(self)
+			check_startup_position()
 
 	def adjustment_changed(self, widget):
 		value = widget.get_value()
 		self.refract_value(value, "gtk")
 
+	@property
+	def key(self):
+		return "%s:%s" % (type(self).__name__, self.channel_name)
+
+	reports_back = True # Does a backend echo our writes? Not for groups or stand-ins
+	heard_from_backend = False
+	def recall(self, value, muted):
+		# Apply a snapshot state, returning a future that resolves once the
+		# backend reports the new value back
+		confirmed = asyncio.get_running_loop().create_future()
+		if value == self.oldvalue:
+			confirmed.set_result(value) # Nothing to send, so nothing to wait for
+		else:
+			if self.reports_back:
+				self.confirming = (value, confirmed)
+			else:
+				confirmed.set_result(value) # Nobody will ever say so, so take it as done
+			self.refract_value(value, "snapshot")
+		if bool(muted) != self.mute.get_active():
+			self.mute.set_active(muted)
+		return confirmed
+
 	def refract_value(self, value, source):
-		# Send value to multiple places, keeping track of sent value to
-		# avoid bounce or slider fighting.
+		# Send value to multiple places. Backend reports are first matched
+		# against our own writes still in flight: those arrive late and
+		# rounded, and mustn't drag the slider back or be sent out again.
+		Recorder.refract(self.key, source, value)
+		if source == "backend":
+			first_report = not self.heard_from_backend
+			self.heard_from_backend = True
+			echo = self.limiter.is_echo(value, self.echo_tolerance)
+			value = self.duck_scale(value, 1 / self.duck_gain) # Backend is reporting what ducking sent it
+			if self.confirming:
+				target, confirmed = self.confirming
+				if abs(value - target) <= self.echo_tolerance and not confirmed.done():
+					confirmed.set_result(value)
+					self.confirming = None
+			if echo:
+				return
+			if value != self.oldvalue:
+				self.limiter.stats["external"] += 1
 		if value != self.oldvalue:
 			#print(self.channel_name, source, value)
 			if source != "gtk":
@@ -359,25 +1015,73 @@ class Channel(Gtk.Frame):
 				if selected_channel is self:
 					self.write_analog(value)
 			if source != "backend":
-				self.write_external(value)
+				# A group's own writes are already rate-limited, so its members
+				# send straight away and land in the same batch as each other
+				self.send_external(value, immediate=source == "group")
 			self.oldvalue = value
+			notify(self)
+		elif source == "backend" and first_report:
+			notify(self) # Its level is known now, even though it hasn't changed
+		if source == "backend" and awaiting_position and selected_channel is self:
+			check_startup_position() # The cache may have had it right all along
 
 	def write_analog(self, value):
-		global slider_last_wrote # TODO: Check whether this is actually needed, now that last_wrote isn't
-		if time.monotonic() > slider_last_wrote + 0.1:
-			Analog.goal = value
-			slider_last_wrote = time.monotonic()
-			print("Slider goal: %s" % Analog.goal)
+		seek_fader(value)
+
+	# Writes to the backend go through the limiter (see Limiter.py), which
+	# keeps fades and fast drags from flooding it and matches up the echoes
+	write_interval = Limiter.INTERVAL
+	def send_external(self, value, immediate=False):
+		self.limiter.send(value, immediate)
+
+	@property
+	def external_writes(self):
+		return self.limiter.writes
+
+	# Ducking scales what the backend gets, but not what the slider shows.
+	# The gain is an amplitude; duck_scale() turns it into a change of this
+	# backend's volume setting, which isn't linear in amplitude everywhere.
+	duck_gain = 1.0
+	def duck_scale(self, value, gain):
+		return value * gain
+
+	def ducked(self, value):
+		return self.duck_scale(value, self.duck_gain)
+
+	def set_duck(self, gain):
+		if gain != self.duck_gain:
+			self.duck_gain = gain
+			self.send_external(self.oldvalue)
 
 	# Fallback function if subclasses don't provide write_external()
 	def write_external(self, value):
 		print(self.channel_name, value)
 
+	# For backends whose send is asynchronous: only the latest volume matters,
+	# so a burst of changes while a send is in flight collapses into one.
+	# Subclasses call this from write_external() and provide send_volume().
+	pending_volume = None
+	sender = None
+	def coalesce_volume(self, value):
+		self.pending_volume = value
+		if self.sender is None or self.sender.done():
+			self.sender = asyncio.create_task(self.flush_volume())
+
+	async def flush_volume(self):
+		while self.pending_volume is not None:
+			value, self.pending_volume = self.pending_volume, None
+			try:
+				await self.send_volume(value)
+			except ConnectionError:
+				print("%s connection lost" % self.channel_name)
+				break
+
 	# Fallback/superclass functions
 	def muted(self, widget):
 		mute_state = widget.get_active()
 		self.mute.set_label(self.mute_labels[mute_state])
 		print(self.channel_name, "un" * (not mute_state) + "muted")
+		notify(self)
 		return mute_state
 
 	def update_position(self, value):
@@ -389,7 +1093,15 @@ class Channel(Gtk.Frame):
 		if selected_channel is self:
 			selected_channel = None # Because it doesn't make sense to select another module
 		print("Removing:", self.channel_name)
+		if self.external_writes:
+			stats = self.limiter.stats
+			print("%s: %d writes, echoes: %d (%d stale), external changes: %d" % (self.channel_name, self.external_writes,
+				stats["echoes"], stats["stale echoes"], stats["external"]))
+		Automation.cancel(self)
+		meters.forget(self)
+		self.limiter.cancel()
 		self.group.remove(self)
+		notify(self)
 
 class Dummy(Channel):
 	def __init__(self, stop):
@@ -397,25 +1109,36 @@ class Dummy(Channel):
 
 class VLC(Channel):
 	step = 1.0
+	echo_tolerance = 1.0 # TellMeVLC only deals in whole percentages
 
-	def __init__(self, writer):
-		super().__init__(name="VLC")
+	def __init__(self, name, writer):
+		super().__init__(name=name)
 		self.writer = writer
 
 	def write_external(self, value):
+		self.coalesce_volume(value)
+
+	async def send_volume(self, value):
+		if not self.writer:
+			return # Reconnecting; TellMeVLC will tell us where it is when it's back
 		self.writer.write(b"volume %d \r\n" %value)
-		asyncio.create_task(self.writer.drain())
-		print("To VLC: ", value)
+		Recorder.outbound(self.channel_name, b"volume %d" %value)
+		print("To %s: " % self.channel_name, value)
+		await self.writer.drain()
 
 	def muted(self, widget):
 		mute_state = super().muted(widget)
+		if not self.writer:
+			return
 		self.writer.write(b"muted %d \r\n" %mute_state)
+		Recorder.outbound(self.channel_name, b"muted %d" %mute_state)
 		asyncio.create_task(self.writer.drain())
-		print("VLC Mute status:", mute_state)
+		print("%s Mute status:" % self.channel_name, mute_state)
 
 class WebcamFocus(Channel):
 	mute_labels = ("AF Off", "AF On")
 	step = 1.0 # Cameras have different steps but v4l2 will round any value to the step for the camera in question
+	echo_tolerance = 1.0
 
 	def __init__(self, cam_name, cam_path, ssh):
 		self.device_name = cam_name
@@ -431,6 +1154,7 @@ class WebcamFocus(Channel):
 		# Feedback continues when AF is on, so theoretically value should be correct.
 		if not self.mute.get_active():
 			self.ssh.stdin.write(("focus_absolute %d %s\n" % (value, self.device)).encode("utf-8"))
+			Recorder.outbound("webcam", "focus_absolute %d %s" % (value, self.device))
 			asyncio.create_task(self.write_ssh())
 
 	async def write_ssh(self):
@@ -442,6 +1166,7 @@ class WebcamFocus(Channel):
 	def muted(self, widget):
 		mute_state = super().muted(widget)
 		self.ssh.stdin.write(("focus_auto %d %s\n" % (mute_state, self.device)).encode("utf-8"))
+		Recorder.outbound("webcam", "focus_auto %d %s" % (mute_state, self.device))
 		asyncio.create_task(self.ssh.stdin.drain())
 		print("%s Autofocus " %self.device_name + ("Dis", "En")[mute_state] + "abled")
 
@@ -455,23 +1180,146 @@ class OBS(Channel):
 	def write_external(self, value):
 		obs_send({"request-type": "SetVolume", "message-id": "volume", "source": self.name, "volume": ((value / 100) ** 2)})
 
+	def duck_scale(self, value, gain):
+		return value * gain ** 0.5 # OBS gets the square of the slider
+
 	def muted(self, widget):
 		mute_state = super().muted(widget)
 		obs_send({"request-type": "SetMute", "message-id": "mute", "source": self.name, "mute": mute_state})
 
 class Browser(Channel):
 	def __init__(self, tabid):
-		super().__init__(name="Browser")
 		self.tabid = tabid
+		super().__init__(name="Browser")
+
+	@property
+	def key(self):
+		return "Browser:" + self.tabid # Every tab is just called "Browser"
 
 	def write_external(self, value):
+		Recorder.outbound("browser", "setvolume %s %s" % (self.tabid, value / 100))
 		asyncio.create_task(WebSocket.set_volume(self.tabid, (value / 100)))
 	
 	def muted(self, widget):
 		mute_state = super().muted(widget)
+		Recorder.outbound("browser", "setmuted %s %d" % (self.tabid, mute_state))
 		asyncio.create_task(WebSocket.set_muted(self.tabid, mute_state))
 
-async def main():
+class PulseAudio(Channel):
+	def __init__(self, pa, facility, info):
+		self.pa = pa
+		self.facility = facility
+		self.info = info
+		if facility == "sink_input":
+			name = info.proplist.get("application.name", info.name)
+		else:
+			name = info.description
+		super().__init__(name=name)
+		self.update(info)
+
+	@property
+	def key(self):
+		# Streams from one application share its name, and sinks can share a
+		# description; the server's own name or index for them can't clash
+		ident = self.info.index if self.facility == "sink_input" else self.info.name
+		return "PulseAudio:%s:%s" % (self.facility, ident)
+
+	def update(self, info):
+		self.info = info
+		self.refract_value(info.volume.value_flat * 100, "backend")
+		self.mute.set_active(info.mute)
+
+	def write_external(self, value):
+		self.coalesce_volume(value)
+
+	def duck_scale(self, value, gain):
+		return value * gain ** (1 / 3) # Pulse volumes are cubic in amplitude
+
+	async def send_volume(self, value):
+		try:
+			Recorder.outbound("pulse", "volume %s %s" % (self.key, value / 100))
+			await self.pa.volume_set_all_chans(self.info, value / 100)
+		except pulsectl.PulseOperationFailed:
+			pass # Stream went away mid-change; its remove event will tidy up
+
+	def muted(self, widget):
+		mute_state = super().muted(widget)
+		Recorder.outbound("pulse", "mute %s %d" % (self.key, mute_state))
+		asyncio.create_task(self.pa.mute(self.info, mute_state))
+
+class Group(Channel):
+	# One master fader driving several channels, possibly across backends.
+	# Members are named (or keyed) with an offset in dB from the master, or
+	# None to keep whatever ratio they had when first seen by the group.
+	# Members never report back to the group, so their echoes can't bounce.
+	reports_back = False
+	recalling = False
+	def __init__(self, name, members):
+		super().__init__(name=name)
+		self.members = members
+		self.gains = {member: 10 ** (offset / 20) for member, offset in members.items() if offset is not None}
+		for channel in all_channels():
+			self.link(channel)
+
+	def member_name(self, channel):
+		for member in (channel.channel_name, channel.key):
+			if member in self.members:
+				return member
+
+	def link(self, channel):
+		# A member without an offset keeps the ratio it has to the master when
+		# its real level is first known. That has to be settled here, while
+		# both values are where they were, rather than in the middle of a move.
+		member = self.member_name(channel)
+		if member is None or member in self.gains or isinstance(channel, (Cached, Group)):
+			return
+		if channel.reports_back and not channel.heard_from_backend:
+			return
+		self.gains[member] = channel.oldvalue / self.oldvalue if self.oldvalue else 1.0
+
+	def recall(self, value, muted):
+		# The members are in the snapshot in their own right, so the master
+		# only takes up its old position; driving them as well would fight
+		# whatever they're being recalled to.
+		confirmed = asyncio.get_running_loop().create_future()
+		confirmed.set_result(value)
+		if value != self.oldvalue:
+			self.update_position(value)
+			self.oldvalue = value
+			notify(self)
+		if bool(muted) != self.mute.get_active():
+			self.recalling = True
+			try:
+				self.mute.set_active(muted)
+			finally:
+				self.recalling = False
+		return confirmed
+
+	def linked(self):
+		for channel in all_channels():
+			if channel is self or isinstance(channel, Group):
+				continue
+			member = self.member_name(channel)
+			if member in self.gains:
+				yield channel, self.gains[member]
+
+	def write_external(self, value):
+		for channel, gain in self.linked():
+			channel.refract_value(min(value * gain, 150.0), "group")
+
+	def set_duck(self, gain):
+		# Each member ducks in its own backend's terms
+		for channel, _ in self.linked():
+			channel.set_duck(gain)
+
+	def muted(self, widget):
+		mute_state = super().muted(widget)
+		if self.recalling:
+			return
+		for channel, gain in self.linked():
+			channel.mute.set_active(mute_state)
+
+async def main(replay_log=None, fast=False):
 	stop = asyncio.Event() # Hold open until destroy signal triggers this event
 	main_ui = Gtk.Window(title="Bio Box")
 	main_ui.set_resizable(False)
@@ -487,14 +1335,84 @@ async def main():
 	menu_entries = []
 	class Task():
 		running = {}
+		# The config settings each task depends on: when any of them changes,
+		# a config reload restarts the task.
+		settings = {
+			"VLC": {"host", "vlc_port", "vlc_instances"},
+			"WebcamFocus": {"host", "webcam_user", "webcam_control_path", "webcam_command", "webcams"},
+			"OBS": {"host", "obs_port", "obs_meter_port", "ducking"},
+			"PulseAudio": set(),
+			"Group": {"channel_groups"},
+			"Browser": set(),
+		}
 		def VLC():
 			return vlc(stop)
 		def WebcamFocus():
 			return webcam(stop)
 		def OBS():
-			return obs_ws(stop)
+			return obs_tasks(stop)
+		def PulseAudio():
+			return pulse(stop)
+		def Group():
+			return linked_groups(stop)
 		def Browser():
-			return WebSocket.listen(connected=new_tab, disconnected=closed_tab, volumechanged=tab_volume_changed)
+			return WebSocket.listen(connected=new_tab, disconnected=closed_tab, volumechanged=tab_volume_changed, levels=tab_levels)
+	def snapshot_save_dialog(action):
+		dialog = Gtk.Dialog(title="Save snapshot", transient_for=main_ui, modal=True)
+		dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, Gtk.STOCK_SAVE, Gtk.ResponseType.OK)
+		entry = Gtk.Entry(activates_default=True)
+		dialog.get_content_area().add(entry)
+		dialog.set_default_response(Gtk.ResponseType.OK)
+		def response(dialog, response_id):
+			if response_id == Gtk.ResponseType.OK and entry.get_text().strip():
+				save_snapshot(entry.get_text().strip())
+			dialog.destroy()
+		dialog.connect("response", response)
+		dialog.show_all()
+	def snapshot_recall_dialog(action):
+		names = list(load_snapshots())
+		if not names:
+			print("No snapshots saved yet")
+			return
+		dialog = Gtk.Dialog(title="Recall snapshot", transient_for=main_ui, modal=True)
+		dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, "Recall", Gtk.ResponseType.OK)
+		chooser = Gtk.ComboBoxText()
+		for name in names:
+			chooser.append_text(name)
+		chooser.set_active(0)
+		dialog.get_content_area().add(chooser)
+		def response(dialog, response_id):
+			if response_id == Gtk.ResponseType.OK:
+				asyncio.create_task(recall_snapshot(chooser.get_active_text()))
+			dialog.destroy()
+		dialog.connect("response", response)
+		dialog.show_all()
+	def fade_dialog(action):
+		channel = selected_channel
+		if not channel:
+			print("Select a channel to fade first")
+			return
+		dialog = Gtk.Dialog(title="Fade " + channel.channel_name, transient_for=main_ui, modal=True)
+		dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, "Fade", Gtk.ResponseType.OK)
+		grid = Gtk.Grid(column_spacing=5, row_spacing=5)
+		target = Gtk.SpinButton.new_with_range(0, 150, 1)
+		target.set_value(0 if channel.oldvalue else 100)
+		duration = Gtk.SpinButton.new_with_range(0.1, 600, 0.5)
+		duration.set_value(5)
+		curve = Gtk.ComboBoxText()
+		for name in Automation.curves:
+			curve.append(name, name)
+		curve.set_active(0)
+		for row, (label, widget) in enumerate([("Target", target), ("Seconds", duration), ("Curve", curve)]):
+			grid.attach(Gtk.Label(label=label), 0, row, 1, 1)
+			grid.attach(widget, 1, row, 1, 1)
+		dialog.get_content_area().add(grid)
+		def response(dialog, response_id):
+			if response_id == Gtk.ResponseType.OK:
+				Automation.fade(channel, target.get_value(), duration.get_value(), curve.get_active_id())
+			dialog.destroy()
+		dialog.connect("response", response)
+		dialog.show_all()
 	def toggle_menu_item(widget):
 		toggle_group = widget.get_name()
 		if widget.get_active():
@@ -515,6 +1433,33 @@ async def main():
 			pass
 		finally:
 			print(task, "cancellation complete")
+	async def apply_config():
+		started = time.monotonic()
+		changed = reload_config()
+		if changed is None:
+			return
+		restart = [task for task in Task.running if changed & Task.settings.get(task, set())]
+		await asyncio.gather(*[cancel_task(task) for task in restart])
+		for task in restart:
+			live_timers[task] = started, "config reload"
+			start_task(task)
+		if "page_size" in changed:
+			pager.page_size = getattr(config, "page_size", 4)
+		# Read once at startup, so changing these still means a restart
+		fixed = changed & {"osc_port", "web_port", "throttle_source", "thermal_source"}
+		report("Config reloaded in %.0fms: changed %s; restarted %s%s" % ((time.monotonic() - started) * 1000,
+			", ".join(sorted(changed)) or "nothing", ", ".join(restart) or "nothing",
+			"; restart BioBox to apply " + ", ".join(sorted(fixed)) if fixed else ""))
+	reload_pending = None
+	def config_file_changed(monitor, file, other_file, event):
+		# Editors save in all sorts of ways (rewriting in place, or writing
+		# elsewhere and renaming over the top), and often in several steps.
+		# Wait for it all to settle before looking.
+		nonlocal reload_pending
+		if event in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED):
+			if reload_pending:
+				reload_pending.cancel()
+			reload_pending = asyncio.get_running_loop().call_later(0.2, lambda: asyncio.create_task(apply_config()))
 	async def cancel_all():
 		print("Shutting down - cancelling all tasks")
 		await asyncio.gather(*[cancel_task(t) for t in Task.running])
@@ -530,29 +1475,81 @@ async def main():
 		menu_entry = ("%s" %group_name, None, group_name, None, None, toggle_menu_item, True) #Second last param is callback function, boolean is default state
 		menu_entries.append(menu_entry)
 	#Dummy()
+	ui_items += "<separator /><menuitem action='Profiler' />"
+	menu_entries.append(("Profiler", None, "Profiler", None, None, lambda widget: set_profiling(widget.get_active()), False))
 	ui_tree = UI_HEADER + ui_items + UI_FOOTER
 	action_group.add_action(Gtk.Action(name="ModulesMenu", label="Modules"))
 	action_group.add_toggle_actions(menu_entries)
+	global profiler_action
+	profiler_action = action_group.get_action("Profiler")
+	GLib.unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGUSR1, profiler_signal)
+	action_group.add_actions([
+		("AutomationMenu", None, "Automation"),
+		("FadeSelected", None, "Fade selected channel...", None, None, fade_dialog),
+		("SnapshotsMenu", None, "Snapshots"),
+		("SnapshotSave", None, "Save snapshot...", None, None, snapshot_save_dialog),
+		("SnapshotRecall", None, "Recall snapshot...", None, None, snapshot_recall_dialog),
+		("NavigateMenu", None, "Navigate"),
+		("PagePrev", None, "Previous page", "<Control>Page_Up", None, lambda action: pager.flip_page(-1)),
+		("PageNext", None, "Next page", "<Control>Page_Down", None, lambda action: pager.flip_page(1)),
+		("ChannelPrev", None, "Previous channel", "<Control>Left", None, lambda action: pager.step(-1)),
+		("ChannelNext", None, "Next channel", "<Control>Right", None, lambda action: pager.step(1)),
+	])
 	ui_manager = Gtk.UIManager()
 	ui_manager.add_ui_from_string(ui_tree)
 	ui_manager.insert_action_group(action_group)
 	menubar = ui_manager.get_widget("/MenuBar")
+	main_ui.add_accel_group(ui_manager.get_accel_group())
 	menubox.pack_start(menubar, False, False, 0)
 	menubox.add(modules)
+	global meters
+	meters = Meters.Meters()
+	menubox.add(meters)
 
 
-	GLib.timeout_add(1000, init_motor_pos)
+	if getattr(config, "web_port", None):
+		watchers.append(web_changed) # Before the cache, so clients see its stand-ins too
+	if replay_log:
+		watchers.remove(cache_changed) # Replayed channels aren't worth remembering
+	elif not restore_state_cache():
+		GLib.timeout_add(1000, init_motor_pos)
 	# Show window
 	def halt(*a): # We could use a lambda function unless we need IIDPIO
+		# Save now, while the window's channels are all still there to save
+		if cache_changed in watchers:
+			watchers.remove(cache_changed)
+			save_state_cache()
+		set_profiling(False) # Don't lose a profile just because we're closing
+		if pager.latencies:
+			times = sorted(pager.latencies)
+			report("Fader usable after selection: p50 %.0fms, max %.0fms over %d selections" % (
+				times[len(times) // 2] * 1000, times[-1] * 1000, len(times)))
 		asyncio.create_task(cancel_all())
 	main_ui.connect("destroy", halt)
 	main_ui.show_all()
+	if replay_log:
+		# The log stands in for the slider and every backend
+		replay_task = asyncio.create_task(replay(replay_log, fast))
+		await stop.wait()
+		return
 	# TODO: Have the ability to cancel these tasks (such as when disabled in menu)
 	slider_task = asyncio.create_task(read_analog())
+	config_monitor = Gio.File.new_for_path(config.__file__).monitor_file(Gio.FileMonitorFlags.NONE, None)
+	config_monitor.connect("changed", config_file_changed)
+	for task in Task.settings:
+		live_timers[task] = launch_time, "launch"
+	governor_task = asyncio.create_task(Governor.run(apply_governor,
+		throttle_source=getattr(config, "throttle_source", None), thermal_source=getattr(config, "thermal_source", None)))
+	if getattr(config, "osc_port", None):
+		osc_task = asyncio.create_task(OSC.listen(volume=osc_volume, mute=osc_mute, subscribed=osc_subscribed, other=osc_other, port=config.osc_port))
+	if getattr(config, "web_port", None):
+		web_task = asyncio.create_task(WebControl.listen(setvolume=web_setvolume, setmuted=web_setmuted, select=web_select, port=config.web_port))
 	start_task("VLC")
 	start_task("OBS")
 	start_task("Browser")
 	start_task("WebcamFocus")
+	start_task("PulseAudio")
+	start_task("Group")
 	await stop.wait()
 	motor_cleanup()
 	
@@ -574,6 +1571,15 @@ if __name__ == "__main__":
 		Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
 	)
 
-	loop = asyncio.new_event_loop()
-	asyncio.set_event_loop(loop)
-	loop.run_until_complete(main())
+	parser = argparse.ArgumentParser(description="Bio Box")
+	parser.add_argument("--record", metavar="FILE", help="Record every input, goal and backend message to an event log")
+	parser.add_argument("--replay", metavar="FILE", help="Replay an event log instead of using the slider and backends")
+	parser.add_argument("--fast", action="store_true", help="Replay as fast as possible rather than in real time")
+	args = parser.parse_args()
+	if args.record:
+		Recorder.start(args.record)
+
+	try:
+		asyncio.run(main(args.replay, args.fast))
+	finally:
+		Recorder.stop()
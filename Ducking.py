@@ -0,0 +1,57 @@
+# Automatic ducking: pull target channels down while a trigger source is live
+# Fed from OBS's volume meters at around 50 Hz. All the work per meter update
+# is a handful of float operations on the trigger's peak, and targets are only
+# touched when the gain has moved by a noticeable amount, so the GTK loop
+# barely notices it.
+import math
+import time
+
+SILENCE = -100.0 # dB floor, since log10(0) is unhelpful
+GAIN_STEP = 0.01 # Smallest gain change worth sending to the targets
+
+class Ducker():
+	def __init__(self, trigger, targets, threshold=-30.0, depth=-15.0, attack=0.05, release=0.5):
+		self.trigger = trigger
+		self.targets = set(targets)
+		self.threshold = threshold # dBFS peak level that counts as "live"
+		self.floor = 10 ** (depth / 20) # Gain applied when fully ducked
+		self.attack = attack # Seconds to duck
+		self.release = release # Seconds to recover
+		self.gain = self.sent_gain = 1.0
+		self.last_update = None
+		self.triggered_at = None # For measuring trigger-to-duck latency
+
+	def is_target(self, channel):
+		return channel.channel_name in self.targets or channel.key in self.targets
+
+	def update(self, levels, now=None):
+		"""Feed one meter update for the trigger
+
+		levels is OBS's inputLevelsMul: [magnitude, peak, input peak] per
+		audio channel, all linear. Returns the new gain if the targets should
+		be updated, or None if the change is too small to bother with.
+		"""
+		now = now or time.monotonic()
+		dt = now - self.last_update if self.last_update else 0.02
+		self.last_update = now
+		peak = max((chan[1] for chan in levels), default=0.0)
+		level = 20 * math.log10(peak) if peak > 0 else SILENCE
+		live = level >= self.threshold
+		if live and self.gain == 1.0 and self.triggered_at is None:
+			self.triggered_at = now
+		# One-pole smoothing towards the goal, with separate time constants
+		# for ducking and recovering
+		goal = self.floor if live else 1.0
+		tc = self.attack if goal < self.gain else self.release
+		self.gain += (goal - self.gain) * (1 - math.exp(-dt / tc))
+		if abs(self.gain - goal) < GAIN_STEP / 2:
+			self.gain = goal # Settle exactly rather than creeping forever
+		if self.gain == 1.0 and not live:
+			self.triggered_at = None
+		if self.gain == self.floor and self.triggered_at is not None:
+			print(time.time(), "Ducked %s %.1fms after trigger" % (", ".join(sorted(self.targets)), (now - self.triggered_at) * 1000))
+			self.triggered_at = None
+		if self.gain == self.sent_gain or (abs(self.gain - self.sent_gain) < GAIN_STEP and self.gain != goal):
+			return None
+		self.sent_gain = self.gain
+		return self.gain
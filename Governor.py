@@ -0,0 +1,138 @@
+# Power- and heat-aware performance governor for BioBox on a Raspberry Pi
+# Every few seconds, checks whether the Pi is under-voltage, throttled or hot,
+# and picks a profile to match: when it's struggling, the ADC is polled less
+# often, the meters and web clients are redrawn less often, and the motor is
+# held below full duty. Back to normal once things have been healthy for a
+# while. Uses asyncio; create run() as a task.
+#
+# Throttle state comes from the firmware's get_throttled (in sysfs on recent
+# kernels, otherwise from vcgencmd), temperature from the thermal zone. Either
+# can be pointed at an ordinary file instead, for testing: echo 0x50005 > file
+import asyncio
+import time
+
+THROTTLE_FILES = ["/sys/devices/platform/soc/soc:firmware/get_throttled"]
+THERMAL_FILE = "/sys/class/thermal/thermal_zone0/temp"
+HOT = 75.0 # Degrees C; the firmware starts soft-limiting at 80
+RECOVERY = 3 # Healthy checks in a row before going back to normal
+# The live bits of get_throttled; the high ones only say it's happened before
+FLAGS = {0x1: "under-voltage", 0x2: "frequency capped", 0x4: "throttled", 0x8: "soft temperature limit"}
+
+PROFILES = {
+	"normal": {"sample_hz": 64, "meter_fps": 60, "web_fps": 30, "motor_ceiling": 100},
+	"throttled": {"sample_hz": 32, "meter_fps": 15, "web_fps": 10, "motor_ceiling": 75},
+}
+
+async def read_throttled(path=None):
+	# Returns the get_throttled flags, or None if there's no way to find out
+	for fn in [path] if path else THROTTLE_FILES:
+		try:
+			with open(fn) as f:
+				text = f.read()
+			break
+		except OSError:
+			continue
+	else:
+		if path: return None
+		try:
+			proc = await asyncio.create_subprocess_exec("vcgencmd", "get_throttled",
+				stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+			text = (await proc.communicate())[0].decode("ascii", "replace")
+		except OSError:
+			return None
+	# Either bare hex from sysfs, or throttled=0x50005 as vcgencmd says it
+	try:
+		return int(text.strip().rpartition("=")[2], 16)
+	except ValueError:
+		return None
+
+def read_temperature(path=None):
+	try:
+		with open(path or THERMAL_FILE) as f:
+			return int(f.read().strip()) / 1000
+	except (OSError, ValueError):
+		return None
+
+def describe(flags, temp):
+	problems = [name for bit, name in FLAGS.items() if flags and flags & bit]
+	if temp is not None and temp >= HOT:
+		problems.append("hot")
+	return problems
+
+async def run(apply, *, throttle_source=None, thermal_source=None, interval=5.0):
+	# apply(profile_name, settings) is called at startup and on every change
+	current = None
+	healthy = 0
+	while True:
+		flags = await read_throttled(throttle_source)
+		temp = read_temperature(thermal_source)
+		if current is None and flags is None and temp is None:
+			print("Governor: no throttle or temperature information, staying at normal")
+			apply("normal", PROFILES["normal"])
+			return
+		problems = describe(flags, temp)
+		healthy = 0 if problems else healthy + 1
+		# Throttle down straight away, but only recover once it's stuck
+		wanted = "throttled" if problems else "normal" if healthy >= RECOVERY or current is None else current
+		if wanted != current:
+			settings = PROFILES[wanted]
+			print(time.time(), "Governor: %s (%s%s) - ADC %dHz, meters %dfps, web %dfps, motor ceiling %d%%" % (
+				wanted, ", ".join(problems) or "healthy", "" if temp is None else ", %.1f°C" % temp,
+				settings["sample_hz"], settings["meter_fps"], settings["web_fps"], settings["motor_ceiling"]))
+			apply(wanted, settings)
+			current = wanted
+		await asyncio.sleep(interval)
+
+if __name__ == "__main__":
+	# Benchmark: the simulated fader kept busy seeking, plus the web control
+	# surface with five clients watching a channel that changes 60 times a
+	# second, first healthy and then throttled, driven by a stand-in throttle
+	# file. Reports CPU and wake-ups for each. (The meters need GTK, so their
+	# redraw savings aren't included here.)
+	import os, tempfile
+	import websockets
+	import SimAnalog, WebControl
+	def apply(name, settings):
+		SimAnalog.sample_interval = 1 / settings["sample_hz"]
+		SimAnalog.max_speed = settings["motor_ceiling"]
+		WebControl.FRAME = 1 / settings["web_fps"]
+	def wakeups():
+		with open("/proc/self/status") as f:
+			return sum(int(line.split()[1]) for line in f if "ctxt_switches" in line)
+	async def main(seconds=5):
+		fd, source = tempfile.mkstemp()
+		os.close(fd)
+		def set_flags(flags):
+			with open(source, "w") as f: f.write("throttled=0x%x\n" % flags)
+		set_flags(0)
+		governor = asyncio.create_task(run(apply, throttle_source=source, thermal_source=source + ".none", interval=0.5))
+		server = asyncio.create_task(WebControl.listen(port=8897))
+		await asyncio.sleep(0.2)
+		async def client():
+			async with websockets.connect("ws://127.0.0.1:8897/ws") as sock:
+				async for msg in sock: pass
+		clients = [asyncio.create_task(client()) for _ in range(5)]
+		async def fader():
+			async for pos in SimAnalog.read_value(): pass
+		async def seeking():
+			while True:
+				SimAnalog.goal = 90 if SimAnalog.position < 50 else 10
+				await asyncio.sleep(0.4)
+		async def levels():
+			n = 0
+			while True:
+				n += 1
+				WebControl.update("OBS:Mic", name="Mic", value=float(n % 150), muted=False, cached=False)
+				await asyncio.sleep(1 / 60)
+		load = [asyncio.create_task(f()) for f in (fader, seeking, levels)]
+		for flags in (0, 0x50005):
+			set_flags(flags)
+			await asyncio.sleep(1.5)
+			cpu, woken = time.process_time(), wakeups()
+			await asyncio.sleep(seconds)
+			print("  0x%05x: CPU %.1f%%, %.0f wake-ups/s" % (flags, (time.process_time() - cpu) / seconds * 100, (wakeups() - woken) / seconds))
+		for task in load + clients + [server, governor]:
+			task.cancel()
+		await asyncio.gather(*load, *clients, server, governor, return_exceptions=True)
+		os.unlink(source)
+	asyncio.run(main())
@@ -0,0 +1,126 @@
+# Write limiting and echo matching for one channel's backend
+# Rate-limits writes, so that fades and fast drags don't flood OBS or the
+# browser sockets: the latest value always gets through, at most interval
+# seconds after the one before it. Every write that goes out is remembered
+# until the backend echoes it back (or ECHO_TIMEOUT passes), so that a late,
+# rounded echo isn't taken for a change made at the backend's end.
+# Nothing in here touches GTK, so it can be run and measured on its own.
+import asyncio
+import collections
+import time
+
+INTERVAL = 1 / 30
+ECHO_TIMEOUT = 2.0 # Seconds after which a write that never echoed is forgotten
+
+class Limiter():
+	def __init__(self, write, interval=INTERVAL, prepare=None):
+		# write(value) sends to the backend. prepare(value), if given, turns
+		# a channel value into what the backend is sent (ducking, say), since
+		# that is what an echo will carry.
+		self.write = write
+		self.prepare = prepare
+		self.interval = interval
+		self.value = None
+		self.last = 0.0
+		self.writes = 0
+		self.seq = 0
+		self.throttled = None
+		self.inflight = collections.deque() # (seq, value, time sent) not yet echoed
+		self.stats = collections.Counter()
+
+	def send(self, value, immediate=False):
+		self.value = value
+		if self.throttled and not immediate:
+			return # Already scheduled, and will pick up the new value
+		delay = self.last + self.interval - time.monotonic()
+		if immediate or delay <= 0:
+			if self.throttled:
+				self.throttled.cancel()
+			self.flush()
+		else:
+			self.throttled = asyncio.get_event_loop().call_later(delay, self.flush)
+
+	def flush(self):
+		self.throttled = None
+		self.last = time.monotonic()
+		self.writes += 1
+		self.seq += 1
+		# Some channels (group masters, cached stand-ins) never hear an echo,
+		# so is_echo() can't be relied on to clear out the old writes
+		self.expire(self.last)
+		sent = self.prepare(self.value) if self.prepare else self.value
+		self.inflight.append((self.seq, sent, self.last))
+		self.write(sent)
+
+	def expire(self, now):
+		while self.inflight and self.inflight[0][2] < now - ECHO_TIMEOUT:
+			self.inflight.popleft()
+
+	def is_echo(self, value, tolerance):
+		# Backends report changes in the order we made them, so an echo of
+		# one write also means any older ones have been and gone.
+		self.expire(time.monotonic())
+		for i, (seq, sent, when) in enumerate(self.inflight):
+			if abs(value - sent) <= tolerance:
+				for _ in range(i + 1):
+					self.inflight.popleft()
+				self.stats["echoes"] += 1
+				if seq != self.seq:
+					# Echo of a superseded write; comparing against the current
+					# value would take these as new input and bounce the fader.
+					self.stats["stale echoes"] += 1
+				return True
+		return False
+
+	def cancel(self):
+		if self.throttled:
+			self.throttled.cancel()
+			self.throttled = None
+
+if __name__ == "__main__":
+	# Count redundant round trips during a drag: backend reports that the
+	# channel takes for a change made at the backend's end, pulling the fader
+	# back to where it was. A 60Hz sawtooth drag goes through a Limiter into
+	# two stand-in backends that echo each write, in order, after a delay,
+	# rounded the way they round it; each echo is judged both the old way
+	# (anything that isn't the current value is a change) and by is_echo().
+	import random
+	import struct
+	BACKENDS = {
+		"OBS": (lambda value: struct.unpack("f", struct.pack("f", (value / 100) ** 2))[0] ** 0.5 * 100, 0.5),
+		"VLC": (lambda value: int(value * 2.56) / 2.56, 1.0),
+	}
+	async def drag(name, latency, jitter, seconds=5):
+		loop = asyncio.get_running_loop()
+		rounding, tolerance = BACKENDS[name]
+		current = 0.0
+		counts = collections.Counter()
+		def echo(value):
+			counts["echoes"] += 1
+			if value != current:
+				counts["before"] += 1
+			if not limiter.is_echo(value, tolerance) and value != current:
+				counts["after"] += 1
+		arrival = 0.0
+		def write(value):
+			# One connection per backend, so the echoes come back in order
+			nonlocal arrival
+			arrival = max(arrival + 0.000001, loop.time() + latency + random.uniform(-jitter, jitter))
+			loop.call_at(arrival, echo, rounding(value))
+		limiter = Limiter(write)
+		start = time.monotonic()
+		step = 0
+		while time.monotonic() < start + seconds:
+			step += 1
+			current = float(abs(step % 200 - 100))
+			limiter.send(current)
+			await asyncio.sleep(1 / 60)
+		await asyncio.sleep(latency + jitter + INTERVAL)
+		return counts
+	async def main():
+		for latency, jitter in ((0.001, 0), (0.02, 0.01), (0.1, 0.05)):
+			for name in BACKENDS:
+				counts = await drag(name, latency, jitter)
+				print("%s, %3.0fms +/- %2.0fms: %d echoes, redundant round trips before %d, after %d" % (
+					name, latency * 1000, jitter * 1000, counts["echoes"], counts["before"], counts["after"]))
+	asyncio.run(main())
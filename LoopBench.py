@@ -0,0 +1,125 @@
+# Event loop benchmark: PyGObject's native asyncio integration versus gbulb
+# Each loop runs in its own process, with a GTK window, the Mock.py VLC and OBS
+# stand-ins, and clients hammering them at fader-drag rates. Measures:
+#
+#   latency   how late a 5ms call_later fires while under that load
+#   cpu       process CPU while under load, and again while idle
+#   wakeups   voluntary context switches per second while idle
+#
+# Usage: python3 LoopBench.py [--seconds N] [glib|gbulb ...]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+def wakeups():
+	with open("/proc/self/status") as f:
+		for line in f:
+			if line.startswith("voluntary_ctxt_switches:"):
+				return int(line.split()[1])
+
+def percentile(values, pct):
+	values = sorted(values)
+	return values[min(len(values) * pct // 100, len(values) - 1)] * 1000
+
+async def measure(seconds):
+	from gi.repository import Gtk, GLib
+	import websockets
+	import Mock
+	window = Gtk.Window(title="Loop benchmark")
+	scale = Gtk.Scale.new_with_range(Gtk.Orientation.VERTICAL, 0, 150, 1)
+	window.add(scale)
+	window.show_all()
+	servers = [asyncio.create_task(Mock.vlc(24321)), asyncio.create_task(Mock.obs(24322))]
+	await asyncio.sleep(0.2)
+
+	async def vlc_load():
+		reader, writer = await asyncio.open_connection("127.0.0.1", 24321)
+		async def drain():
+			async for line in reader: pass
+		asyncio.create_task(drain())
+		step = 0
+		while True:
+			step += 1
+			writer.write(b"volume %d\r\n" % (step % 150))
+			await asyncio.sleep(1 / 60)
+	async def obs_load():
+		async with websockets.connect("ws://127.0.0.1:24322") as sock:
+			async def drain():
+				async for msg in sock: pass
+			asyncio.create_task(drain())
+			step = 0
+			while True:
+				step += 1
+				await sock.send(json.dumps({"request-type": "SetVolume", "message-id": "volume", "source": "Mic", "volume": (step % 100) / 100}))
+				await asyncio.sleep(1 / 60)
+	def gtk_load():
+		scale.set_value((scale.get_value() + 1) % 150)
+		return True
+	loop = asyncio.get_running_loop()
+	lateness = []
+	probing = True
+	def probe(due=None):
+		now = loop.time()
+		if due is not None:
+			lateness.append(now - due)
+		if probing:
+			loop.call_later(0.005, probe, now + 0.005)
+
+	load = [asyncio.create_task(vlc_load()), asyncio.create_task(obs_load())]
+	ticker = GLib.timeout_add(33, gtk_load)
+	probe()
+	cpu = time.process_time()
+	await asyncio.sleep(seconds)
+	busy_cpu = (time.process_time() - cpu) / seconds * 100
+	for task in load:
+		task.cancel()
+	GLib.source_remove(ticker)
+	# Stop probing, leaving only the servers and the window: nothing should
+	# need to wake up at all now.
+	probing = False
+	await asyncio.sleep(0.5)
+	cpu, woken = time.process_time(), wakeups()
+	await asyncio.sleep(seconds)
+	idle_cpu = (time.process_time() - cpu) / seconds * 100
+	idle_wakeups = (wakeups() - woken) / seconds
+	for task in servers:
+		task.cancel()
+	window.destroy()
+	return {"p50": percentile(lateness, 50), "p99": percentile(lateness, 99), "max": max(lateness) * 1000,
+		"busy_cpu": busy_cpu, "idle_cpu": idle_cpu, "wakeups": idle_wakeups}
+
+def child(kind, seconds):
+	import gi
+	gi.require_version("Gtk", "3.0")
+	if kind == "glib":
+		from gi.events import GLibEventLoopPolicy
+		asyncio.set_event_loop_policy(GLibEventLoopPolicy())
+	else:
+		import gbulb
+		gbulb.install(gtk=True)
+	print(json.dumps(asyncio.run(measure(seconds))))
+
+def main():
+	parser = argparse.ArgumentParser(description="BioBox event loop benchmark")
+	parser.add_argument("loops", nargs="*", default=["glib", "gbulb"])
+	parser.add_argument("--seconds", type=float, default=10)
+	parser.add_argument("--child", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		return child(args.child, args.seconds)
+	print("%-6s %9s %9s %9s %8s %8s %9s" % ("loop", "p50 ms", "p99 ms", "max ms", "busy %", "idle %", "wakeup/s"))
+	for kind in args.loops:
+		proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind, "--seconds", str(args.seconds)],
+			capture_output=True, text=True)
+		if proc.returncode:
+			print("%-6s failed: %s" % (kind, (proc.stderr.strip().split("\n") or ["?"])[-1]))
+			continue
+		r = json.loads(proc.stdout.strip().split("\n")[-1])
+		print("%-6s %9.2f %9.2f %9.2f %8.1f %8.1f %9.1f" % (kind, r["p50"], r["p99"], r["max"], r["busy_cpu"], r["idle_cpu"], r["wakeups"]))
+
+if __name__ == "__main__":
+	main()
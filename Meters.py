@@ -0,0 +1,182 @@
+# Level meters for all channel strips, drawn by a single widget
+# Every channel's meter state lives in one packed array, which the backends
+# write into whenever levels arrive. Nothing is drawn at that point; instead,
+# the widget checks once per frame (and no more often than max_fps) whether
+# anything changed, decays each column of the array in one pass, and redraws
+# the whole row in one go. The frame clock only ticks while some meter is
+# showing something; once they have all fallen to nothing, it stops.
+import array
+import math
+import time
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gtk, GLib
+
+FLOOR = -60.0 # dB shown as an empty meter
+DECAY = 24.0 # dB per second that peaks fall back by
+HOLD = 1.5 # Seconds a peak-hold marker stays put
+# Fields per meter in the packed array. Levels are stored linear, 0.0-1.0.
+PEAK, RMS, HELD, HELD_UNTIL = range(4)
+FIELDS = 4
+
+def to_fraction(level):
+	# Linear level to the fraction of the meter to light up
+	if level <= 0:
+		return 0.0
+	return min(max(1 - 20 * math.log10(level) / FLOOR, 0.0), 1.0)
+
+def decay(levels, elapsed, now):
+	# Let peaks and RMS fall, and drop expired peak-holds. Each field is a
+	# column of the packed array, done as one slice; columns already all
+	# zero are skipped. Returns whether any meter still shows anything.
+	fall = 10 ** (-DECAY * elapsed / 20)
+	lit = False
+	for field in (PEAK, RMS):
+		column = levels[field::FIELDS]
+		if any(column):
+			levels[field::FIELDS] = array.array("d", [level * fall if level > 0.001 else 0.0 for level in column])
+			lit = True
+	held = levels[HELD::FIELDS]
+	if any(held):
+		levels[HELD::FIELDS] = array.array("d", [0.0 if now > until else level
+			for level, until in zip(held, levels[HELD_UNTIL::FIELDS])])
+		lit = True
+	return lit
+
+class Meters(Gtk.DrawingArea):
+	max_fps = 60 # Lowered when the Pi needs to save power
+
+	def __init__(self):
+		super().__init__()
+		self.set_size_request(-1, 60)
+		self.levels = array.array("d")
+		self.slots = { } # Channel to its index in levels
+		self.free = [ ]
+		self.dirty = False
+		self.last_frame = 0.0
+		self.ticker = None
+		self.connect("draw", self.draw)
+
+	def wake(self):
+		self.dirty = True
+		if self.ticker is None:
+			self.last_frame = time.monotonic()
+			self.ticker = self.add_tick_callback(self.tick)
+
+	def slot(self, channel):
+		if channel not in self.slots:
+			if self.free:
+				self.slots[channel] = self.free.pop()
+			else:
+				self.slots[channel] = len(self.levels) // FIELDS
+				self.levels.extend([0.0] * FIELDS)
+		return self.slots[channel] * FIELDS
+
+	def forget(self, channel):
+		slot = self.slots.pop(channel, None)
+		if slot is not None:
+			self.levels[slot * FIELDS:slot * FIELDS + FIELDS] = array.array("d", [0.0] * FIELDS)
+			self.free.append(slot)
+			self.wake()
+
+	def update(self, channel, peak, rms):
+		# Called as often as levels arrive; cheap enough not to matter
+		base = self.slot(channel)
+		levels = self.levels
+		if peak > levels[base + PEAK]:
+			levels[base + PEAK] = peak
+		if rms > levels[base + RMS]:
+			levels[base + RMS] = rms
+		if peak >= levels[base + HELD]:
+			levels[base + HELD] = peak
+			levels[base + HELD_UNTIL] = time.monotonic() + HOLD
+		self.wake()
+
+	def tick(self, widget, frame_clock):
+		now = time.monotonic()
+		if now - self.last_frame < 1 / self.max_fps:
+			return GLib.SOURCE_CONTINUE
+		elapsed = min(now - self.last_frame, 1.0)
+		self.last_frame = now
+		lit = decay(self.levels, elapsed, now)
+		if self.dirty or lit:
+			self.dirty = False
+			self.queue_draw() # One last time once they're all empty
+		if not lit:
+			self.ticker = None
+			return GLib.SOURCE_REMOVE
+		return GLib.SOURCE_CONTINUE
+
+	def draw(self, widget, cr):
+		height = self.get_allocated_height()
+		cr.set_source_rgb(0.1, 0.1, 0.1)
+		cr.paint()
+		levels = self.levels
+		for channel, slot in self.slots.items():
+			pos = channel.translate_coordinates(self, 0, 0)
+			if not pos:
+				continue # Not laid out yet
+			x = pos[0] + 4
+			width = channel.get_allocated_width() - 8
+			base = slot * FIELDS
+			rms = to_fraction(levels[base + RMS]) * height
+			peak = to_fraction(levels[base + PEAK]) * height
+			held = to_fraction(levels[base + HELD]) * height
+			cr.set_source_rgb(0.2, 0.7, 0.2)
+			cr.rectangle(x, height - rms, width, rms)
+			cr.fill()
+			cr.set_source_rgb(0.5, 0.9, 0.5)
+			cr.rectangle(x, height - peak, width, 2)
+			cr.fill()
+			if held:
+				if levels[base + HELD] >= 1.0:
+					cr.set_source_rgb(0.9, 0.2, 0.2) # Clipping
+				else:
+					cr.set_source_rgb(0.9, 0.8, 0.2)
+				cr.rectangle(x, height - held, width, 2)
+				cr.fill()
+		return False
+
+if __name__ == "__main__":
+	# Benchmark: 30 channel strips with meters fed at 50 updates a second each,
+	# redrawn at up to 60fps, then the same strips gone silent. Reports the
+	# CPU used while the levels are arriving and once they have stopped.
+	import random
+	count, seconds = 30, 5
+	window = Gtk.Window(title="Meter benchmark")
+	box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+	row = Gtk.Box()
+	strips = [Gtk.Frame(label="Chan %d" % n) for n in range(count)]
+	for strip in strips:
+		strip.set_size_request(40, 200)
+		row.pack_start(strip, False, False, 0)
+	meters = Meters()
+	box.pack_start(row, False, False, 0)
+	box.pack_start(meters, False, False, 0)
+	window.add(box)
+	window.show_all()
+	loop = GLib.MainLoop()
+	feeding = True
+	def feed():
+		for strip in strips:
+			peak = random.uniform(0.05, 0.5)
+			meters.update(strip, peak, peak * 0.7)
+		return feeding
+	results = []
+	def phase(name, then):
+		start = time.process_time()
+		def done():
+			results.append("%s: CPU %.1f%%, meter frame clock %s" % (name,
+				(time.process_time() - start) / seconds * 100, "ticking" if meters.ticker else "stopped"))
+			then()
+			return False
+		GLib.timeout_add(seconds * 1000, done)
+	def silence():
+		global feeding
+		feeding = False
+		GLib.timeout_add(3000, lambda: phase("silent", loop.quit) and False) # Let the meters fall first
+	GLib.timeout_add(20, feed)
+	GLib.timeout_add(1000, lambda: phase("%d meters at 50 updates/s" % count, silence) and False)
+	loop.run()
+	print("\n".join(results))
@@ -0,0 +1,214 @@
+# Stand-in backends for exercising BioBox without the real things
+# Each mock speaks just enough of its protocol for BioBox to be happy, echoes
+# changes back the way the real backend does, and can add latency and jitter
+# to everything it sends. Echoes on one connection never overtake each other,
+# however much jitter there is. Uses asyncio; the servers are coroutines to
+# create as tasks, or run this file to start them from the command line:
+#
+#   python3 Mock.py vlc [port]        TellMeVLC line protocol
+#   python3 Mock.py obs [port]        obs-websocket v4, plus v5 meters on port+11
+#   python3 Mock.py tabs [count]      VolumeSocket browser tabs, connecting to BioBox
+#   python3 Mock.py camera            camera.py agent on stdin/stdout
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import websockets # ImportError? pip install websockets
+
+# Seconds added to every reply, give or take up to jitter seconds at random.
+# The environment sets them for mocks running as separate processes.
+latency = float(os.environ.get("MOCK_LATENCY", 0))
+jitter = float(os.environ.get("MOCK_JITTER", 0))
+received = [] # (time, backend, message) for everything sent to a mock, if tracking
+tracking = False
+
+def track(backend, msg):
+	if tracking:
+		received.append((time.perf_counter(), backend, msg))
+
+class Delayed():
+	# Send things after latency +/- jitter, keeping them in order
+	def __init__(self, send):
+		self.send = send
+		self.last = 0.0
+
+	def __call__(self, msg):
+		loop = asyncio.get_running_loop()
+		when = max(loop.time() + latency + random.uniform(-jitter, jitter), self.last)
+		self.last = when
+		loop.call_at(when, self.send, msg)
+
+# TellMeVLC
+vlc_clients = set()
+vlc_connects = [] # Time of every new connection, if tracking
+
+def vlc_drop_all():
+	# Simulate every TellMeVLC instance going away at once
+	for writer in list(vlc_clients):
+		writer.close()
+
+async def vlc(port=4221, host="127.0.0.1", name="vlc"):
+	async def client(reader, writer):
+		vlc_clients.add(writer)
+		if tracking:
+			vlc_connects.append(time.perf_counter())
+		state = {"volume": 100, "muted": 0}
+		reply = Delayed(lambda line: writer.is_closing() or writer.write(line.encode("utf-8")))
+		try:
+			async for line in reader:
+				cmd, *args = line.decode("utf-8").split()
+				track(name, line)
+				if cmd in state:
+					if args:
+						state[cmd] = int(args[0])
+					reply("%s: %d\r\n" % (cmd, state[cmd]))
+		except ConnectionError:
+			pass
+		finally:
+			vlc_clients.discard(writer)
+			writer.close()
+	server = await asyncio.start_server(client, host, port)
+	async with server:
+		await server.serve_forever()
+
+# OBS
+scenes = {
+	"Main": ["Mic", "Desktop", "Music"],
+	"BRB": ["Music", "Jingle"],
+}
+obs_clients = set()
+obs_sources = { } # Source name to {"volume", "muted"}
+
+def obs_source(name):
+	state = obs_sources.setdefault(name, {"volume": 1.0, "muted": False})
+	return {"id": "pulse_input_capture", "name": name, "type": "pulse_input_capture",
+		"volume": state["volume"], "muted": state["muted"]}
+
+def obs_broadcast(msg):
+	msg = json.dumps(msg)
+	for reply in list(obs_clients):
+		reply(msg)
+
+async def obs(port=4444, host="127.0.0.1"):
+	scene = "Main"
+	async def client(sock, path):
+		reply = Delayed(lambda msg: asyncio.create_task(sock.send(msg)))
+		obs_clients.add(reply)
+		def handle(request):
+			kind = request.get("request-type")
+			if kind == "GetCurrentScene":
+				return {"status": "ok", "name": scene, "sources": [obs_source(s) for s in scenes[scene]]}
+			if kind == "SetVolume":
+				obs_source(request["source"])
+				obs_sources[request["source"]]["volume"] = request["volume"]
+				obs_broadcast({"update-type": "SourceVolumeChanged", "sourceName": request["source"], "volume": request["volume"]})
+				return {"status": "ok"}
+			if kind == "SetMute":
+				obs_source(request["source"])
+				obs_sources[request["source"]]["muted"] = request["mute"]
+				obs_broadcast({"update-type": "SourceMuteStateChanged", "sourceName": request["source"], "muted": request["mute"]})
+				return {"status": "ok"}
+			if kind == "ExecuteBatch":
+				return {"status": "ok", "results": [handle(r) for r in request["requests"]]}
+			return {"status": "error", "error": "Unsupported by Mock.py"}
+		try:
+			async for msg in sock:
+				track("obs", msg)
+				request = json.loads(msg)
+				response = handle(request)
+				response["message-id"] = request.get("message-id")
+				reply(json.dumps(response))
+		except websockets.ConnectionClosed:
+			pass
+		finally:
+			obs_clients.discard(reply)
+	async with websockets.serve(client, host, port):
+		await asyncio.Future()
+
+def obs_switch_scene(name):
+	obs_broadcast({"update-type": "SwitchScenes", "scene-name": name, "sources": [obs_source(s) for s in scenes[name]]})
+
+async def obs_meters(port=4455, host="127.0.0.1", rate=50, levels=None):
+	# levels is a function from source name to a linear peak; by default,
+	# everything sits at a gently wobbling -20dB
+	levels = levels or (lambda name: 0.1 * random.uniform(0.9, 1.1))
+	async def client(sock, path):
+		await sock.send(json.dumps({"op": 0, "d": {"obsWebSocketVersion": "5.0.0-mock", "rpcVersion": 1}}))
+		await sock.recv() # Identify; whatever it asks for, it gets meters
+		await sock.send(json.dumps({"op": 2, "d": {"negotiatedRpcVersion": 1}}))
+		while True:
+			await asyncio.sleep(1 / rate)
+			inputs = [{"inputName": name, "inputLevelsMul": [[peak * 0.7, peak, peak]] * 2}
+				for name, peak in ((name, levels(name)) for name in obs_sources)]
+			await sock.send(json.dumps({"op": 5, "d": {"eventType": "InputVolumeMeters", "eventIntent": 1 << 16, "eventData": {"inputs": inputs}}}))
+	async with websockets.serve(client, host, port):
+		await asyncio.Future()
+
+# VolumeSocket
+async def tab(uri="ws://127.0.0.1:8888/ws", group=None, lifetime=None):
+	# One browser tab: reports its volume, and echoes whatever BioBox sets
+	group = group or "mock-%s" % random.random()
+	volume, muted = 1.0, False
+	async with websockets.connect(uri) as sock:
+		reply = Delayed(lambda msg: asyncio.create_task(sock.send(msg)))
+		await sock.send(json.dumps({"cmd": "init", "type": "volume", "group": group}))
+		await sock.send(json.dumps({"cmd": "setvolume", "volume": volume, "muted": muted}))
+		async def listen():
+			nonlocal volume, muted
+			async for msg in sock:
+				track("tab", msg)
+				msg = json.loads(msg)
+				if msg["cmd"] == "setvolume":
+					volume = msg["volume"]
+				elif msg["cmd"] == "setmuted":
+					muted = msg["muted"]
+				else:
+					continue
+				reply(json.dumps({"cmd": "setvolume", "volume": volume, "muted": muted}))
+		try:
+			await asyncio.wait_for(listen(), lifetime)
+		except (asyncio.TimeoutError, websockets.ConnectionClosed):
+			pass
+
+# camera.py
+def camera():
+	# Same conversation as camera.py, on stdin/stdout, with imaginary webcams
+	print("Info: Hi", flush=True)
+	cams = { }
+	for line in sys.stdin:
+		cmd, *args, dev = line.strip().split()
+		time.sleep(max(latency + random.uniform(-jitter, jitter), 0))
+		if cmd == "quit":
+			print("Info: Bye", flush=True)
+			break
+		elif cmd == "cam_check":
+			cams[dev] = {"focus_absolute": 0, "focus_auto": 0}
+			print("%s: set_range: 0 255 5" % dev)
+			for ctrl, value in cams[dev].items():
+				print("%s: %s: %d" % (dev, ctrl, value))
+		elif cmd in ("focus_absolute", "focus_auto") and dev in cams:
+			cams[dev][cmd] = int(args[0]) // 5 * 5 if cmd == "focus_absolute" else int(args[0])
+			print("%s: %s: %d" % (dev, cmd, cams[dev][cmd]))
+		else:
+			print("Unknown command:", cmd)
+		sys.stdout.flush()
+
+if __name__ == "__main__":
+	kind = sys.argv[1] if len(sys.argv) > 1 else None
+	arg = int(sys.argv[2]) if len(sys.argv) > 2 else None
+	if kind == "camera":
+		camera()
+	elif kind == "vlc":
+		asyncio.run(vlc(arg or 4221))
+	elif kind == "obs":
+		async def both(port):
+			await asyncio.gather(obs(port), obs_meters(port + 11))
+		asyncio.run(both(arg or 4444))
+	elif kind == "tabs":
+		async def tabs(count):
+			await asyncio.gather(*[tab() for _ in range(count)])
+		asyncio.run(tabs(arg or 10))
+	else:
+		print("Usage: python3 Mock.py vlc|obs|tabs|camera [port|count]")
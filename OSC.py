@@ -0,0 +1,202 @@
+# OSC-over-UDP remote control for BioBox
+# Accepts /channel/<name>/volume (float, 0-150) and /channel/<name>/mute
+# (int or true/false), plus /subscribe and /unsubscribe from clients that want
+# changes sent back to them. Uses asyncio; create listen() as a task.
+#
+# Controllers can send far more often than any backend wants to hear. For each
+# channel and control, a change arriving after a quiet spell is delivered on
+# the next loop pass; during a burst, deliveries are at least INPUT_INTERVAL
+# apart and carry only the latest value. Feedback to subscribers is likewise
+# rate-limited per channel.
+import asyncio
+import struct
+import time
+
+callbacks = { }
+subscribers = set()
+transport = None
+pending = { } # (channel, control) to latest value, awaiting delivery
+feedback = { } # channel name to (volume, muted) awaiting the rate limiter
+last_feedback = { }
+last_delivery = { }
+packets_in = 0
+INPUT_INTERVAL = 1 / 100
+FEEDBACK_INTERVAL = 1 / 30
+
+def pad(data):
+	return data + b"\0" * (4 - len(data) % 4)
+
+def read_string(data, pos):
+	end = data.index(b"\0", pos)
+	return data[pos:end].decode("utf-8", "replace"), (end + 4) & ~3
+
+def parse(data):
+	# Yield (address, args) for a message, or every message in a bundle
+	if data.startswith(b"#bundle\0"):
+		pos = 16 # Skip the time tag; everything is applied immediately
+		while pos < len(data):
+			size, = struct.unpack(">i", data[pos:pos + 4])
+			yield from parse(data[pos + 4:pos + 4 + size])
+			pos += 4 + size
+		return
+	address, pos = read_string(data, 0)
+	if pos >= len(data):
+		yield address, []
+		return
+	tags, pos = read_string(data, pos)
+	args = []
+	for tag in tags[1:]:
+		if tag == "f":
+			args.append(struct.unpack(">f", data[pos:pos + 4])[0]); pos += 4
+		elif tag == "i":
+			args.append(struct.unpack(">i", data[pos:pos + 4])[0]); pos += 4
+		elif tag == "d":
+			args.append(struct.unpack(">d", data[pos:pos + 8])[0]); pos += 8
+		elif tag == "s":
+			value, pos = read_string(data, pos)
+			args.append(value)
+		elif tag in "TF":
+			args.append(tag == "T")
+		else:
+			break # Unknown type, so we can't find anything after it
+	yield address, args
+
+def encode(address, *args):
+	tags = ","
+	payload = b""
+	for arg in args:
+		if isinstance(arg, bool):
+			tags += "T" if arg else "F"
+		elif isinstance(arg, int):
+			tags += "i"
+			payload += struct.pack(">i", arg)
+		elif isinstance(arg, float):
+			tags += "f"
+			payload += struct.pack(">f", arg)
+		else:
+			tags += "s"
+			payload += pad(str(arg).encode("utf-8"))
+	return pad(address.encode("utf-8")) + pad(tags.encode("ascii")) + payload
+
+class Server(asyncio.DatagramProtocol):
+	def datagram_received(self, data, addr):
+		global packets_in
+		packets_in += 1
+		try:
+			messages = list(parse(data))
+		except (ValueError, struct.error):
+			return # Ignore malformed packets
+		for address, args in messages:
+			if address == "/subscribe":
+				subscribers.add(addr)
+				cb = callbacks.get("subscribed")
+				if cb: cb(addr)
+				continue
+			if address == "/unsubscribe":
+				subscribers.discard(addr)
+				continue
+			parts = address.split("/")
+			if len(parts) == 4 and parts[1] == "channel" and parts[3] in ("volume", "mute") and args:
+				key = parts[2], parts[3]
+				if key not in pending:
+					delay = last_delivery.get(key, 0) + INPUT_INTERVAL - time.monotonic()
+					asyncio.get_running_loop().call_later(max(delay, 0), deliver, key)
+				pending[key] = args[0]
+			else:
+				cb = callbacks.get("other")
+				if cb: cb(address, args)
+
+def deliver(key):
+	last_delivery[key] = time.monotonic()
+	value = pending.pop(key)
+	channel, control = key
+	cb = callbacks.get(control)
+	if cb: cb(channel, value)
+
+def publish(channel, volume, muted):
+	# Tell subscribers about a change, no more than once per FEEDBACK_INTERVAL
+	# per channel. The latest state always goes out eventually.
+	if not subscribers or not transport:
+		return
+	if channel in feedback:
+		feedback[channel] = (volume, muted)
+		return
+	feedback[channel] = (volume, muted)
+	delay = last_feedback.get(channel, 0) + FEEDBACK_INTERVAL - time.monotonic()
+	asyncio.get_running_loop().call_later(max(delay, 0), send_feedback, channel)
+
+def send_feedback(channel):
+	volume, muted = feedback.pop(channel)
+	last_feedback[channel] = time.monotonic()
+	packets = [encode("/channel/%s/volume" % channel, float(volume)), encode("/channel/%s/mute" % channel, int(muted))]
+	for addr in list(subscribers):
+		for packet in packets:
+			transport.sendto(packet, addr)
+
+def send_to(addr, address, *args):
+	if transport:
+		transport.sendto(encode(address, *args), addr)
+
+async def listen(*, volume=None, mute=None, subscribed=None, other=None, host="", port=9000):
+	global transport
+	callbacks.update(volume=volume, mute=mute, subscribed=subscribed, other=other)
+	try:
+		transport, protocol = await asyncio.get_running_loop().create_datagram_endpoint(Server, local_addr=(host, port))
+	except OSError as e:
+		if e.errno != 98: raise # 98: Address already in use
+		return
+	print("OSC listening on UDP port", port)
+	try:
+		await asyncio.Future() # Run until cancelled
+	finally:
+		transport.close()
+		transport = None
+		subscribers.clear()
+		print("OSC shutting down.")
+
+if __name__ == "__main__":
+	# Load test: several controllers hammering the server over loopback.
+	# Reports how many messages per second went in, how many distinct values
+	# came out after coalescing, and how long the survivors took.
+	import sys
+	controllers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+	rate = int(sys.argv[2]) if len(sys.argv) > 2 else 1000 # Messages per second per controller
+	seconds = 5
+	port = 9999
+	sent = { } # (channel, value) to time sent
+	latencies = []
+	received = 0
+	def got_volume(channel, value):
+		global received
+		received += 1
+		when = sent.pop((channel, value), None)
+		if when is not None:
+			latencies.append(time.perf_counter() - when)
+	async def controller(n):
+		loop = asyncio.get_running_loop()
+		sock, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=("127.0.0.1", port))
+		count = 0
+		start = time.perf_counter()
+		while time.perf_counter() < start + seconds:
+			# Send in 10ms bursts, as a fast fader or touch surface would
+			while count < (time.perf_counter() - start) * rate:
+				count += 1
+				value = float(count % 150)
+				sent["ctl%d" % n, value] = time.perf_counter()
+				sock.sendto(encode("/channel/ctl%d/volume" % n, value))
+			await asyncio.sleep(0.01)
+		sock.close()
+		return count
+	async def main():
+		server = asyncio.create_task(listen(volume=got_volume, host="127.0.0.1", port=port))
+		await asyncio.sleep(0.1)
+		counts = await asyncio.gather(*[controller(n) for n in range(controllers)])
+		await asyncio.sleep(0.1)
+		server.cancel()
+		total = sum(counts)
+		latencies.sort()
+		print("%d controllers: %d msg/s sent, %d msg/s received, %d deliveries/s after coalescing" % (
+			controllers, total / seconds, packets_in / seconds, received / seconds))
+		if latencies:
+			print("Packet to delivery: p50 %.3fms p99 %.3fms" % (latencies[len(latencies) // 2] * 1000, latencies[len(latencies) * 99 // 100] * 1000))
+	asyncio.run(main())
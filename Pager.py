@@ -0,0 +1,199 @@
+# Fader bank paging for BioBox's one motorised fader
+# Channels are split into pages of page_size, in the order they appear on
+# screen. Navigation flips a page (landing on whichever channel was last used
+# on it) or steps to the next/previous channel. Every selection sends the
+# motor off to the new channel's value, and until it gets there, fader input
+# is ignored: it's the motor moving, or a hand fighting it, and either way it
+# isn't meant for the new channel.
+#
+# Flips in quick succession (a held key, say) are a burst. Chasing every
+# channel along the way is wasted motion; instead, if history says where
+# bursts from here tend to stop, the motor heads straight for that channel's
+# value, and only once the burst is over does it seek the one actually landed
+# on. Guess right and the fader is usable almost immediately.
+import asyncio
+import collections
+import time
+
+BURST = 0.25 # Flips closer together than this are one burst
+TOLERANCE = 1.0 # Percent of travel; the same as the motor's own
+GATE_TIMEOUT = 2.0 # A hand that keeps fighting the motor gets its way
+RETRIES = 3
+
+class Pager:
+	def __init__(self, *, channels, value, seek, choose, page_size=4):
+		# channels() lists channel keys in order; value(key) is where the fader
+		# should be for that channel; seek(pos) sends the motor there; and
+		# choose(key) selects a channel, which must call back into select().
+		self.channels, self.value, self.seek, self.choose = channels, value, seek, choose
+		self.page_size = page_size
+		self.selected = None
+		self.gated = False
+		self.gated_since = 0.0
+		self.retries = 0
+		self.flipping = False
+		self.last_flip = 0.0
+		self.direction = 0
+		self.origin = None # Where the current burst started
+		self.predicted = None
+		self.settler = None
+		self.landings = collections.defaultdict(collections.Counter) # Origin to where bursts from it stopped
+		self.last_on_page = { } # Page number to the channel last selected on it
+		self.latencies = [] # Seconds from each settled selection to a usable fader
+		self.predictions = collections.Counter()
+
+	def pages(self):
+		keys = self.channels()
+		return [keys[i:i + self.page_size] for i in range(0, len(keys), self.page_size)]
+
+	def page_of(self, key):
+		for n, page in enumerate(self.pages()):
+			if key in page:
+				return n
+
+	# Navigation
+	def flip_page(self, delta):
+		pages = self.pages()
+		if not pages: return
+		current = self.page_of(self.selected)
+		n = 0 if current is None else (current + delta) % len(pages)
+		key = self.last_on_page.get(n)
+		self.navigate(key if key in pages[n] else pages[n][0], delta)
+
+	def step(self, delta):
+		keys = self.channels()
+		if not keys: return
+		n = keys.index(self.selected) + delta if self.selected in keys else 0
+		self.navigate(keys[n % len(keys)], delta)
+
+	def navigate(self, key, direction):
+		self.flipping, self.direction = True, direction
+		try:
+			self.choose(key)
+		finally:
+			self.flipping = False
+
+	# Selection and seeking
+	def target(self):
+		return min(max(self.value(self.selected), 0), 100)
+
+	def select(self, key):
+		if key == self.selected: return
+		now = time.monotonic()
+		previous, self.selected = self.selected, key
+		self.last_on_page[self.page_of(key)] = key
+		self.gated, self.gated_since, self.retries = True, now, 0
+		interval = now - self.last_flip
+		if self.flipping and interval < BURST:
+			goal = self.predict() # Mid-burst: aim for where it'll probably end
+			settle = min(interval * 2, BURST) # Over once it's clearly missed a beat
+		else:
+			self.origin = previous
+			goal = None
+			settle = BURST
+		self.last_flip = now if self.flipping else 0.0
+		self.seek(self.target() if goal is None else goal)
+		if self.settler:
+			self.settler.cancel()
+		self.settler = asyncio.get_running_loop().call_later(settle, self.settle)
+
+	def predict(self):
+		# The most common stop for bursts from this origin, among the channels
+		# still ahead in the direction we're going
+		keys = self.channels()
+		if self.selected not in keys: return None
+		here = keys.index(self.selected)
+		for key, count in self.landings[self.origin].most_common():
+			if key in keys and (keys.index(key) - here) * self.direction >= 0:
+				self.predicted = key
+				return min(max(self.value(key), 0), 100)
+		self.predicted = None
+		return None
+
+	def settle(self):
+		# The burst (if any) is over; make sure we're heading for the right place
+		self.settler = None
+		if self.origin is not None and self.selected != self.origin:
+			if self.predicted is not None:
+				self.predictions["hit" if self.predicted == self.selected else "miss"] += 1
+			self.landings[self.origin][self.selected] += 1
+		self.predicted = None
+		if self.gated:
+			self.seek(self.target())
+
+	def arrived(self, position):
+		# The motor has stopped, wherever that may be
+		if not self.gated: return
+		if abs(position - self.target()) <= TOLERANCE:
+			self.gated = False
+			self.latencies.append(time.monotonic() - self.gated_since)
+		elif self.settler:
+			pass # Mid-burst, and settle() will send it on to the right place
+		elif self.retries < RETRIES:
+			self.retries += 1 # Stopped short, or the goal got replaced; go again
+			self.seek(self.target())
+		else:
+			self.gated = False
+			print("Fader couldn't reach %.1f for %s, stopped at %.1f" % (self.target(), self.selected, position))
+
+	def accept(self):
+		# May fader input go to the selected channel right now?
+		if self.gated and time.monotonic() - self.gated_since > GATE_TIMEOUT:
+			self.gated = False
+		return not self.gated
+
+if __name__ == "__main__":
+	# Benchmark, using the simulated fader: bursts of flips at key-repeat rate
+	# from a home channel, mostly (but not always) stopping at the same few
+	# places, as a person working a show does. Reports how long from the last
+	# flip until the fader was usable, with and without prediction.
+	import random
+	import SimAnalog
+	async def run(predicting, bursts=60, channels=16):
+		random.seed(1)
+		keys = ["Chan%d" % n for n in range(channels)]
+		values = {key: random.uniform(0, 150) for key in keys}
+		pager = None
+		def choose(key): pager.select(key)
+		pager = Pager(channels=lambda: keys, value=values.__getitem__,
+			seek=lambda pos: setattr(SimAnalog, "goal", pos), choose=choose)
+		if not predicting:
+			pager.predict = lambda: None
+		SimAnalog.goal_done = pager.arrived
+		SimAnalog.position = 0.0
+		async def fader():
+			async for pos in SimAnalog.read_value(): pass
+		fader = asyncio.create_task(fader())
+		usable = []
+		favourites = {0: [5, 9], 5: [0, 12], 9: [0], 12: [5]}
+		home = 0
+		choose(keys[home])
+		while pager.gated: await asyncio.sleep(0.005)
+		for burst in range(bursts):
+			if random.random() < 0.8:
+				dest = random.choice(favourites[home])
+			else:
+				dest = random.randrange(channels)
+			if dest == home: continue
+			distance = (dest - home) % channels
+			direction = 1 if distance <= channels // 2 else -1
+			flips = distance if direction == 1 else channels - distance
+			for _ in range(flips):
+				pager.step(direction)
+				await asyncio.sleep(0.06) # Key repeat
+			last_flip = time.monotonic() - 0.06
+			while pager.gated: await asyncio.sleep(0.002)
+			usable.append(time.monotonic() - last_flip)
+			home = dest if dest in favourites else 0
+			if home != dest:
+				pager.step(home - dest) # Wander back home, one big step
+				while pager.gated: await asyncio.sleep(0.002)
+			await asyncio.sleep(0.3)
+		fader.cancel()
+		usable.sort()
+		print("%-13s %d bursts: switch-to-usable p50 %.0fms p90 %.0fms max %.0fms; predictions %s" % (
+			"prediction" if predicting else "no prediction", len(usable),
+			usable[len(usable) // 2] * 1000, usable[len(usable) * 9 // 10] * 1000, usable[-1] * 1000,
+			dict(pager.predictions) or "none"))
+	asyncio.run(run(False))
+	asyncio.run(run(True))
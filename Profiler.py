@@ -0,0 +1,67 @@
+# On-demand profiler for BioBox
+# BioBox does everything on one thread - GTK callbacks, asyncio tasks, the
+# ADC/motor loop - so a single cProfile profiler sees all of it. While it's
+# off, nothing is installed at all, so it costs nothing until asked for.
+#
+# Stopping writes two files, named for the time profiling started: a .prof for
+# pstats/snakeviz, and a .txt with per-task and per-function summaries.
+import asyncio
+import cProfile
+import os
+import pstats
+import time
+
+profiler = None
+started = None
+
+def active():
+	return profiler is not None
+
+def start():
+	global profiler, started
+	if profiler: return
+	profiler = cProfile.Profile()
+	started = time.time()
+	profiler.enable()
+
+def stop(directory="."):
+	# Returns the path to the text report, or None if we weren't profiling
+	global profiler
+	if not profiler: return None
+	profiler.disable()
+	prof, profiler = profiler, None
+	path = os.path.join(directory, time.strftime("profile-%Y%m%d-%H%M%S", time.localtime(started)))
+	prof.dump_stats(path + ".prof")
+	with open(path + ".txt", "w") as f:
+		print("BioBox profile, %.1f seconds from %s" % (time.time() - started, time.ctime(started)), file=f)
+		stats = pstats.Stats(prof, stream=f)
+		print("\nPer task (coroutines of tasks still running at the end):", file=f)
+		print("%10s %10s %8s  %s" % ("cumtime", "tottime", "resumes", "task"), file=f)
+		for cumtime, tottime, resumes, names in task_stats(stats):
+			print("%10.3f %10.3f %8d  %s" % (cumtime, tottime, resumes, names), file=f)
+		print("\nBy cumulative time:", file=f)
+		stats.sort_stats("cumulative").print_stats(40)
+		print("By own time:", file=f)
+		stats.sort_stats("tottime").print_stats(40)
+	return path + ".txt"
+
+def task_stats(stats):
+	# cProfile charges every resumption of a coroutine to its code object, so
+	# a task's share of the time is its coroutine's entry. Tasks running the
+	# same coroutine function (eg one per VLC instance) share an entry.
+	tasks = { }
+	try:
+		running = asyncio.all_tasks()
+	except RuntimeError: # No event loop, eg profiling a replay that's finished
+		running = ()
+	for task in running:
+		code = getattr(task.get_coro(), "cr_code", None)
+		if code:
+			tasks.setdefault((code.co_filename, code.co_firstlineno, code.co_name), []).append(task.get_name())
+	rows = []
+	for key, names in tasks.items():
+		if key in stats.stats:
+			primitive, resumes, tottime, cumtime, callers = stats.stats[key]
+			rows.append((cumtime, tottime, resumes, "%s (%s)" % (key[2], ", ".join(sorted(names)))))
+	rows.sort(reverse=True)
+	return rows
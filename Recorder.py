@@ -0,0 +1,100 @@
+# Event log for BioBox sessions: record once, replay as often as needed
+# Records ADC samples, motor goals, selections, refract_value calls and raw
+# backend traffic with monotonic timestamps, in a compact binary format:
+# a header line, then for each event a fixed-size record header followed by
+# its payload. Nothing is recorded (and next to nothing is done) unless
+# start() has been called.
+import asyncio
+import struct
+import time
+
+MAGIC = b"BioBox event log v1\n"
+RECORD = struct.Struct("<dBI") # Timestamp, kind, payload length
+VALUE = struct.Struct("<d")
+# Event kinds
+ADC, GOAL, SELECT, REFRACT, INBOUND, OUTBOUND = range(1, 7)
+names = {ADC: "adc", GOAL: "goal", SELECT: "select", REFRACT: "refract", INBOUND: "in", OUTBOUND: "out"}
+
+log = None
+
+def start(path):
+	global log
+	log = open(path, "wb", buffering=1 << 16)
+	log.write(MAGIC)
+	print("Recording events to", path)
+
+def stop():
+	global log
+	if log:
+		log.close()
+		log = None
+
+def record(kind, payload):
+	log.write(RECORD.pack(time.monotonic(), kind, len(payload)))
+	log.write(payload)
+
+def sample(volume):
+	if log: record(ADC, VALUE.pack(volume))
+
+def goal(value):
+	if log: record(GOAL, VALUE.pack(value))
+
+def select(key):
+	if log: record(SELECT, key.encode("utf-8"))
+
+def refract(key, source, value):
+	if log: record(REFRACT, VALUE.pack(value) + source.encode("utf-8") + b"\0" + key.encode("utf-8"))
+
+def inbound(backend, msg):
+	if log: record(INBOUND, backend.encode("utf-8") + b"\0" + (msg if isinstance(msg, bytes) else str(msg).encode("utf-8")))
+
+def outbound(backend, msg):
+	if log: record(OUTBOUND, backend.encode("utf-8") + b"\0" + (msg if isinstance(msg, bytes) else str(msg).encode("utf-8")))
+
+def decode(kind, payload):
+	if kind in (ADC, GOAL):
+		return VALUE.unpack(payload)
+	if kind == SELECT:
+		return (payload.decode("utf-8"),)
+	if kind == REFRACT:
+		source, key = payload[VALUE.size:].decode("utf-8").split("\0", 1)
+		return key, source, VALUE.unpack_from(payload)[0]
+	backend, msg = payload.split(b"\0", 1)
+	return backend.decode("utf-8"), msg
+
+def read(path):
+	# Yield (timestamp, kind, fields) for every event in a log
+	with open(path, "rb") as f:
+		if f.read(len(MAGIC)) != MAGIC:
+			raise ValueError("%s is not a BioBox event log" % path)
+		while header := f.read(RECORD.size):
+			if len(header) < RECORD.size:
+				break # Truncated by a crash; everything before it is still good
+			when, kind, size = RECORD.unpack(header)
+			payload = f.read(size)
+			if len(payload) < size:
+				break
+			yield when, kind, decode(kind, payload)
+
+async def replay(path, fast=False):
+	# Like read(), but asynchronously and either at the original pace or as
+	# fast as possible. Timestamps are rebased to start from zero.
+	start = first = None
+	for count, (when, kind, fields) in enumerate(read(path)):
+		if first is None:
+			first, start = when, time.monotonic()
+		if not fast:
+			delay = start + (when - first) - time.monotonic()
+			if delay > 0:
+				await asyncio.sleep(delay)
+		elif count % 100 == 0:
+			await asyncio.sleep(0) # Let the rest of the world (eg GTK) breathe
+		yield when - first, kind, fields
+
+if __name__ == "__main__":
+	# Dump a log as text
+	import sys
+	first = None
+	for when, kind, fields in read(sys.argv[1]):
+		if first is None: first = when
+		print("%10.4f %-7s %s" % (when - first, names.get(kind, kind), " ".join(map(str, fields))))
@@ -0,0 +1,61 @@
+# Simulated motorised fader, standing in for Analog.py where there's no hardware
+# Same interface (including the governor's knobs): set goal, iterate over read_value(), and goal_done is called
+# when the motor gives up a goal. The motor follows the same control rules as
+# Analog.py (full speed from 25% away, 80% speed closer in, brake within 1%),
+# with a little inertia, so seek times are in the same ballpark as the real
+# thing. touch() stands in for a hand on the fader.
+import asyncio
+import time
+
+FULL_SPEED = 400.0 # Percent of travel per second at 100% duty
+ACCEL = 8000.0 # Percent per second per second, in either direction
+TOLERANCE = 1.0
+
+goal = None
+sample_interval = 0.015625
+max_speed = 100
+goal_done = None
+position = 0.0
+touched = None # Where a hand is holding the fader, if anywhere
+
+def touch(pos):
+	global touched
+	touched = pos
+
+def release():
+	global touched
+	touched = None
+
+async def read_value():
+	global goal, position
+	velocity = 0.0
+	goal_completed = 0
+	last_yield = position
+	while True:
+		await asyncio.sleep(sample_interval)
+		if touched is not None:
+			# A hand wins over the motor
+			position, velocity = touched, 0.0
+		if goal is not None:
+			goal = min(max(goal, 0), 100)
+			dist = goal - position
+			if abs(dist) < TOLERANCE:
+				velocity = 0.0
+				goal = None
+				goal_completed = time.monotonic()
+				last_yield = position # Where the motor left it isn't a hand move
+				if goal_done:
+					goal_done(position)
+				continue
+			speed = (FULL_SPEED if abs(dist) >= 25 else FULL_SPEED * 0.8) * max_speed / 100
+			want = speed if dist > 0 else -speed
+			step = ACCEL * sample_interval
+			velocity = min(max(want, velocity - step), velocity + step)
+			if abs(velocity * sample_interval) >= abs(dist) and velocity * dist > 0:
+				position = goal # Close enough to brake onto it
+			else:
+				position = min(max(position + velocity * sample_interval, 0), 100)
+			last_yield = position
+		elif time.monotonic() > goal_completed + 0.15 and abs(position - last_yield) > 0.5:
+			last_yield = position
+			yield position
@@ -0,0 +1,78 @@
+//One connection to BioBox for the whole browser, carrying every tab.
+//Tabs talk to us over runtime ports; we tag their messages with a tab key and
+//send whatever has queued up in one batch per frame. Messages from BioBox carry
+//the tab key and get routed back to the right port.
+const FRAME = 16;
+const tabs = {}; //Tab key to port
+let socket = null, queue = [], flushing = null, retry_delay = 0, browser_id = null;
+
+function tab_key(port) {
+	//Tab IDs are only unique within one browser, and several browsers might
+	//share a BioBox. Frames get their own keys so an embedded player works too.
+	return browser_id + ":" + port.sender.tab.id + ":" + port.sender.frameId;
+}
+
+function send(msg) {
+	queue.push(msg);
+	if (!flushing) flushing = setTimeout(flush, FRAME);
+}
+
+function flush() {
+	flushing = null;
+	//While disconnected, just drop things; everyone resends their state on reconnect
+	if (!socket || socket.readyState !== WebSocket.OPEN) queue = [];
+	if (!queue.length) return;
+	socket.send(JSON.stringify(queue.length === 1 ? queue[0] : {cmd: "batch", msgs: queue}));
+	queue = [];
+}
+
+function connect(server) {
+	socket = new WebSocket(server);
+	socket.onopen = () => {
+		retry_delay = 0;
+		console.log("VolSock connection established.");
+		//Everyone (re)introduces themselves in the first batch
+		queue = [];
+		for (const [key, port] of Object.entries(tabs)) {
+			send({tab: key, cmd: "init", type: "volume"});
+			port.postMessage({cmd: "resend"});
+		}
+	};
+	socket.onclose = () => {
+		console.log("VolSock connection lost.");
+		socket = null;
+		setTimeout(() => connect(server), retry_delay || 250);
+		if (retry_delay < 30000) retry_delay += 5000;
+	};
+	socket.onmessage = ev => {
+		const data = JSON.parse(ev.data);
+		const port = tabs[data.tab];
+		if (port) port.postMessage(data);
+	};
+}
+
+//An open WebSocket only keeps a service worker alive if it's actually used
+setInterval(() => send({cmd: "ping"}), 20000);
+
+//Tab keys need the browser ID, so nothing can happen until that's loaded
+const ready = new Promise(resolve => chrome.storage.local.get({server: "wss://localhost:8888/ws", browser_id: null}, opts => {
+	browser_id = opts.browser_id;
+	if (!browser_id) chrome.storage.local.set({browser_id: browser_id = Math.random().toString(36).slice(2)});
+	resolve();
+	connect(opts.server);
+}));
+
+chrome.runtime.onConnect.addListener(port => ready.then(() => {
+	if (port.name !== "volsock" || !port.sender.tab) return;
+	const key = tab_key(port);
+	tabs[key] = port;
+	send({tab: key, cmd: "init", type: "volume"});
+	port.onMessage.addListener(msgs => {
+		for (const msg of msgs) send({...msg, tab: key});
+	});
+	port.onDisconnect.addListener(() => {
+		if (tabs[key] !== port) return;
+		delete tabs[key];
+		send({tab: key, cmd: "close"});
+	});
+}));
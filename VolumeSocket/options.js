@@ -0,0 +1,7 @@
+const server = document.getElementById("server"), meters = document.getElementById("meters");
+chrome.storage.local.get({server: "wss://localhost:8888/ws", meters: false}, opts => {
+	server.value = opts.server;
+	meters.checked = opts.meters;
+});
+document.getElementById("save").onclick = () => chrome.storage.local.set({server: server.value, meters: meters.checked},
+	() => document.getElementById("status").textContent = "Saved.");
@@ -3,34 +3,118 @@
 //NOTE: This broadly assumes only one important video object, which is
 //always present. It might work with multiple but isn't guaranteed.
 
-//Content scripts aren't allowed to see the actual tab ID, so hack in an unlikely-to-be-duplicated one
-const tabid = Math.random() + "" + Math.random();
-let retry_delay = 5000;
+//The connection to BioBox belongs to the background service worker, which
+//multiplexes every tab over it; this just talks to the worker. Whatever this
+//tab has to say is gathered up and posted once per animation frame.
+let port = null, pending = {}, scheduled = false;
+
+function queue(cmd, msg) {
+	pending[cmd] = {cmd, ...msg}; //Only the latest of each kind matters
+	if (scheduled) return;
+	scheduled = true;
+	//Hidden tabs get no animation frames, but can still be playing audio
+	if (document.hidden) setTimeout(post, 16);
+	else requestAnimationFrame(post);
+}
+function post() {
+	scheduled = false;
+	const msgs = Object.values(pending);
+	pending = {};
+	if (port && msgs.length) port.postMessage(msgs);
+}
+function report_volume() {
+	const vid = document.querySelector("video");
+	if (vid) queue("setvolume", {volume: vid.volume, muted: vid.muted});
+}
+
+//Level metering, if turned on in the extension's options. Routing a media
+//element through WebAudio takes over its output, so it has to be connected
+//back to the speakers - and until the AudioContext is allowed to run, or for
+//good if the media is cross-origin, what comes out is silence. So a video is
+//only routed once the context is running, and never if WebAudio can't hear it.
+//Levels are sampled once per animation frame but only sent ~20 times a second,
+//and not at all while silent.
+let metering = false, audio_ctx = null, analyser = null, samples = null, last_levels = 0, was_silent = true;
+function can_meter(vid)
+{
+	if (!vid.currentSrc || location.protocol === "file:") return false;
+	return vid.crossOrigin !== null || new URL(vid.currentSrc, location.href).origin === location.origin;
+}
+function start_metering(vid)
+{
+	if (!metering || vid.volsock_metered) return;
+	if (!vid.volsock_watched) {
+		//Playing is the likeliest moment for the context to be allowed to start
+		vid.volsock_watched = true;
+		vid.addEventListener("play", () => {
+			if (audio_ctx) audio_ctx.resume();
+			start_metering(vid);
+		});
+	}
+	if (!can_meter(vid)) return;
+	if (!audio_ctx) {
+		audio_ctx = new AudioContext();
+		analyser = audio_ctx.createAnalyser();
+		analyser.fftSize = 1024;
+		analyser.connect(audio_ctx.destination);
+		samples = new Float32Array(analyser.fftSize);
+		audio_ctx.onstatechange = () => document.querySelectorAll("video").forEach(start_metering);
+		requestAnimationFrame(measure_levels);
+	}
+	if (audio_ctx.state !== "running") return; //onstatechange will bring us back
+	vid.volsock_metered = true;
+	audio_ctx.createMediaElementSource(vid).connect(analyser);
+}
+function measure_levels(time)
+{
+	requestAnimationFrame(measure_levels);
+	if (!port || !metering || time - last_levels < 50) return;
+	last_levels = time;
+	analyser.getFloatTimeDomainData(samples);
+	let peak = 0, sum = 0;
+	for (let s of samples) {
+		peak = Math.max(peak, Math.abs(s));
+		sum += s * s;
+	}
+	if (!peak && was_silent) return;
+	was_silent = !peak;
+	queue("levels", {peak, rms: Math.sqrt(sum / samples.length)});
+}
+
 function connect()
 {
-	let socket = new WebSocket("wss://F-35LightningII.rosuav.com:8888/ws");
-	socket.onopen = () => {
-		retry_delay = 0;
-		console.log("VolSock connection established.");
-		socket.send(JSON.stringify({cmd: "init", type: "volume", group: tabid}));
-		document.querySelectorAll("video").forEach(vid =>
-			(vid.onvolumechange = e => socket.send(JSON.stringify({cmd: "setvolume", volume: vid.volume, muted: vid.muted})))()
-		);
-	};
-	socket.onclose = () => {
-		console.log("VolSock connection lost.");
-		setTimeout(connect, retry_delay || 250);
-		if (retry_delay < 30000) retry_delay += 5000;
-	};
-	socket.onmessage = (ev) => {
-		let data = JSON.parse(ev.data);
+	port = chrome.runtime.connect({name: "volsock"});
+	port.onMessage.addListener(data => {
+		if (data.cmd === "resend") report_volume();
 		if (data.cmd === "setvolume") {
 			document.querySelectorAll("video").forEach(vid => vid.volume = data.volume);
 		}
 		if (data.cmd === "setmuted") {
 			document.querySelectorAll("video").forEach(vid => vid.muted = data.muted);
 		}
-	};
+	});
+	//The service worker can be shut down at any time; it'll restart as soon
+	//as we reconnect.
+	port.onDisconnect.addListener(() => {
+		port = null;
+		setTimeout(connect, 250);
+	});
+	document.querySelectorAll("video").forEach(vid => {
+		vid.onvolumechange = report_volume;
+		start_metering(vid);
+	});
+	report_volume();
 }
 if (document.readyState !== "loading") connect();
 else window.addEventListener("DOMContentLoaded", connect);
+
+function set_metering(on)
+{
+	//Turning it off stops the reports, but a video already routed stays routed
+	metering = on;
+	if (on) document.querySelectorAll("video").forEach(start_metering);
+}
+chrome.storage.local.get({meters: false}, opts => set_metering(opts.meters));
+chrome.storage.onChanged.addListener(changes => {
+	if (changes.meters) set_metering(changes.meters.newValue);
+});
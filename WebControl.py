@@ -0,0 +1,137 @@
+# Web control surface for BioBox: a mixer page for phones and tablets
+# Serves control.html over plain HTTP and talks to it over a WebSocket on /ws.
+# Uses asyncio; create listen() as a task.
+#
+# A new client is sent the full state once. After that, every change goes into
+# a pending delta, and all pending deltas go out together, to every client, at
+# most once per FRAME. Every client therefore sees the same changes in the
+# same order, including the ones it made itself.
+import asyncio
+import json
+import os
+import time
+import websockets # ImportError? pip install websockets
+
+FRAME = 1 / 30
+state = { } # Channel key to {"name", "value", "muted", "cached"}
+selected = None
+clients = set()
+callbacks = { }
+deltas = { }
+flusher = None
+bytes_sent = 0
+
+def update(key, **fields):
+	# Record a channel's new state, queueing only the fields that changed
+	old = state.setdefault(key, { })
+	changed = {field: value for field, value in fields.items() if old.get(field) != value}
+	if changed:
+		old.update(changed)
+		if deltas.get(key) is None: # Including one removed and now back again
+			deltas[key] = { }
+		deltas[key].update(changed)
+		schedule()
+
+def removed(key):
+	if state.pop(key, None) is not None:
+		deltas[key] = None
+		schedule()
+
+def set_selected(key):
+	global selected
+	if key != selected:
+		selected = key
+		schedule()
+
+def schedule():
+	global flusher
+	if flusher is None and clients:
+		flusher = asyncio.get_running_loop().call_later(FRAME, flush)
+
+def flush():
+	global flusher, bytes_sent
+	flusher = None
+	msg = json.dumps({"cmd": "delta", "channels": deltas, "selected": selected}, separators=(",", ":"))
+	deltas.clear()
+	bytes_sent += len(msg) * len(clients)
+	websockets.broadcast(clients, msg)
+
+async def control(sock, path):
+	if path != "/ws": return
+	clients.add(sock)
+	try:
+		await sock.send(json.dumps({"cmd": "snapshot", "channels": state, "selected": selected}, separators=(",", ":")))
+		async for msg in sock:
+			try: msg = json.loads(msg)
+			except json.decoder.JSONDecodeError: continue
+			if not isinstance(msg, dict) or msg.get("key") not in state: continue
+			cb = callbacks.get(msg.get("cmd"))
+			if cb: cb(msg["key"], msg.get("value"))
+	except websockets.ConnectionClosedError:
+		pass
+	finally:
+		clients.discard(sock)
+
+async def serve_page(path, request_headers):
+	if path == "/ws":
+		return None # Carry on with the WebSocket handshake
+	if path not in ("/", "/index.html"):
+		return 404, [("Content-Type", "text/plain")], b"Not found\n"
+	with open(os.path.join(os.path.dirname(__file__), "control.html"), "rb") as f:
+		return 200, [("Content-Type", "text/html; charset=utf-8")], f.read()
+
+async def listen(*, setvolume=None, setmuted=None, select=None, host="", port=8889):
+	callbacks.update(setvolume=setvolume, setmuted=setmuted, select=select)
+	try:
+		async with websockets.serve(control, host, port, process_request=serve_page) as server:
+			print("Web control surface on port", port)
+			await server.serve_forever()
+	except OSError as e:
+		if e.errno != 98: raise # 98: Address already in use
+	finally:
+		print("Web control surface shutting down.")
+
+if __name__ == "__main__":
+	# Benchmark: 50 clients watching a 5-second fader drag at 60 updates/sec.
+	# Reports how long each broadcast took to reach the clients, and how many
+	# bytes per second each client received.
+	import sys
+	count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	port = 8899
+	latencies = []
+	received = [0] * count
+	sent_at = { } # Value to the time it was set
+	async def client(n, ready):
+		async with websockets.connect("ws://127.0.0.1:%d/ws" % port, max_size=None) as sock:
+			received[n] += len(await sock.recv()) # Snapshot
+			ready.set_result(None)
+			async for msg in sock:
+				received[n] += len(msg)
+				now = time.perf_counter()
+				change = json.loads(msg)["channels"].get("OBS:Mic")
+				if change and change.get("value") in sent_at:
+					latencies.append(now - sent_at[change["value"]])
+	async def main():
+		server = asyncio.create_task(listen(port=port))
+		for n in range(20):
+			update("OBS:Channel %d" % n, name="Channel %d" % n, value=100.0, muted=False, cached=False)
+		update("OBS:Mic", name="Mic", value=0.0, muted=False, cached=False)
+		await asyncio.sleep(0.2)
+		ready = [asyncio.get_running_loop().create_future() for n in range(count)]
+		clients_done = [asyncio.create_task(client(n, ready[n])) for n in range(count)]
+		await asyncio.gather(*ready)
+		start = received[:]
+		for step in range(300):
+			value = round(step / 3, 2)
+			sent_at[value] = time.perf_counter()
+			update("OBS:Mic", value=value)
+			await asyncio.sleep(1 / 60)
+		await asyncio.sleep(0.2)
+		for task in clients_done:
+			task.cancel()
+		server.cancel()
+		latencies.sort()
+		per_client = sum(r - s for r, s in zip(received, start)) / count / 5
+		print("%d clients: broadcast latency p50 %.2fms p99 %.2fms, %d bytes/s per client" % (
+			count, latencies[len(latencies) // 2] * 1000, latencies[len(latencies) * 99 // 100] * 1000, per_client))
+	asyncio.run(main())
@@ -12,9 +12,16 @@ import websockets # ImportError? pip install websockets
 
 sockets = { }
 callbacks = { }
+muxed = set() # Tab IDs that share their socket with other tabs
 
+# Two protocols share the /ws endpoint. Old-style, each tab has a socket of its
+# own and introduces itself with {"cmd": "init", "type": "volume", "group": id}.
+# Multiplexed, one socket carries every tab in a browser, each message names
+# its tab ({"tab": id, "cmd": ...}, with "close" when the tab goes away), and
+# messages may come batched as {"cmd": "batch", "msgs": [...]}.
 async def volume(sock, path):
 	if path != "/ws": return # Can we send back a 404 or something?
+	tabs = set() # Every tab this socket is speaking for
 	tabid = None
 	try:
 		async for msg in sock:
@@ -22,31 +29,62 @@ async def volume(sock, path):
 			except json.decoder.JSONDecodeError: continue # Ignore malformed messages
 			if not isinstance(msg, dict): continue # Everything should be a JSON object
 			if "cmd" not in msg: continue # Every message has to have a command
-			if msg["cmd"] == "init":
-				if msg.get("type") != "volume": continue # This is the only socket type currently supported
-				if "group" not in msg: continue
-				tabid = str(msg["group"])
-				if tabid not in sockets:
-					cb = callbacks.get("connected")
-					if cb: cb(tabid)
-				else:
-					await send_message(tabid, {"cmd": "disconnect"})
-				sockets[tabid] = sock # Possible floop
-			elif msg["cmd"] == "setvolume":
-				cb = callbacks.get("volumechanged")
-				if cb: cb(tabid, msg.get("volume", 0), bool(msg.get("muted")))
+			if msg["cmd"] == "batch":
+				for m in msg.get("msgs", ()):
+					if isinstance(m, dict) and "cmd" in m and "tab" in m:
+						await handle(sock, tabs, str(m["tab"]), m)
+			elif "tab" in msg:
+				await handle(sock, tabs, str(msg["tab"]), msg)
+			else:
+				tabid = await handle(sock, tabs, tabid, msg)
 	except websockets.ConnectionClosedError:
 		pass
-	# If this sock isn't in the dict, most likely another socket kicked us,
-	# which is uninteresting.
+	for tabid in tabs:
+		gone(sock, tabid)
+
+async def handle(sock, tabs, tabid, msg):
+	# Returns the tab ID, which an old-style init message can change
+	if msg["cmd"] == "init":
+		if msg.get("type") != "volume": return tabid # This is the only socket type currently supported
+		if "tab" not in msg:
+			if "group" not in msg: return tabid
+			tabid = str(msg["group"])
+		if tabid not in sockets:
+			cb = callbacks.get("connected")
+			if cb: cb(tabid)
+		elif sockets[tabid] is not sock:
+			await send_message(tabid, {"cmd": "disconnect"})
+		sockets[tabid] = sock # Possible floop
+		tabs.add(tabid)
+		if "tab" in msg: muxed.add(tabid)
+		else: muxed.discard(tabid)
+	elif msg["cmd"] == "close":
+		gone(sock, tabid)
+		tabs.discard(tabid)
+	elif tabid not in tabs:
+		pass # Tabs have to say hello first
+	elif msg["cmd"] == "setvolume":
+		cb = callbacks.get("volumechanged")
+		if cb: cb(tabid, msg.get("volume", 0), bool(msg.get("muted")))
+	elif msg["cmd"] == "levels":
+		cb = callbacks.get("levels")
+		if cb: cb(tabid, msg.get("peak", 0), msg.get("rms", 0))
+	return tabid
+
+def gone(sock, tabid):
+	# If this sock isn't the tab's any more, most likely another socket kicked
+	# us, which is uninteresting.
 	if sockets.get(tabid) is sock:
 		cb = callbacks.get("disconnected")
 		if cb: cb(tabid)
 		del sockets[tabid]
+		muxed.discard(tabid)
 
 async def send_message(tabid, msg):
 	if tabid not in sockets:
 		return "Gone" # Other end has gone away. Probably not a problem in practice.
+	if tabid in muxed:
+		msg = dict(msg, tab=tabid)
 	await sockets[tabid].send(json.dumps(msg))
 
 async def set_volume(tabid, vol):
@@ -58,8 +96,8 @@ async def set_volume(tabid, vol):
 async def set_muted(tabid, muted):
 	await send_message(tabid, {"cmd": "setmuted", "muted": bool(muted)})
 
-async def listen(*, connected=None, disconnected=None, volumechanged=None, host="", port=8888):
-	callbacks.update(connected=connected, disconnected=disconnected, volumechanged=volumechanged)
+async def listen(*, connected=None, disconnected=None, volumechanged=None, levels=None, host="", port=8888):
+	callbacks.update(connected=connected, disconnected=disconnected, volumechanged=volumechanged, levels=levels)
 	ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
 	try:
 		ssl_context.load_cert_chain("fullchain.pem", "privkey.pem")
@@ -77,9 +115,90 @@ async def listen(*, connected=None, disconnected=None, volumechanged=None, host=
 		print("Websocket shutting down.") # I don't hate you!
 
 # Non-asyncio entry-point
-def run(**kw): asyncio.run(listen(stop=asyncio.Event(), **kw))
+def run(**kw): asyncio.run(listen(**kw))
+
+async def bench(count, seconds=5, port=8898):
+	# Old-style tabs (a socket each) against one multiplexed connection for
+	# them all, every tab playing something and so sending levels 20 times a
+	# second. Reports connections, frames/sec on the wire, and how long it
+	# takes for every tab to be back after the server restarts.
+	import time
+	updates = 0
+	def levels(tabid, peak, rms):
+		nonlocal updates
+		updates += 1
+	frames = 0
+	async def tab(n):
+		# Like the old volsock.js: retry after 250ms, then back off
+		nonlocal frames
+		while True:
+			try:
+				async with websockets.connect("ws://127.0.0.1:%d/ws" % port) as sock:
+					await sock.send(json.dumps({"cmd": "init", "type": "volume", "group": "tab%d" % n}))
+					await sock.send(json.dumps({"cmd": "setvolume", "volume": 1.0, "muted": False}))
+					frames += 2
+					while True:
+						await asyncio.sleep(0.05)
+						await sock.send(json.dumps({"cmd": "levels", "peak": 0.5, "rms": 0.3}))
+						frames += 1
+			except (OSError, websockets.ConnectionClosed):
+				await asyncio.sleep(0.25)
+	async def browser():
+		# Like background.js: one socket, one batch per 16ms frame
+		nonlocal frames
+		while True:
+			try:
+				async with websockets.connect("ws://127.0.0.1:%d/ws" % port) as sock:
+					queue = []
+					for n in range(count):
+						queue.append({"tab": "tab%d" % n, "cmd": "init", "type": "volume"})
+						queue.append({"tab": "tab%d" % n, "cmd": "setvolume", "volume": 1.0, "muted": False})
+					next_levels = [time.monotonic() + n * 0.05 / count for n in range(count)]
+					while True:
+						now = time.monotonic()
+						for n, due in enumerate(next_levels):
+							if now >= due:
+								queue.append({"tab": "tab%d" % n, "cmd": "levels", "peak": 0.5, "rms": 0.3})
+								next_levels[n] = due + 0.05
+						if queue:
+							await sock.send(json.dumps({"cmd": "batch", "msgs": queue}))
+							frames += 1
+							queue = []
+						await asyncio.sleep(0.016)
+			except (OSError, websockets.ConnectionClosed):
+				await asyncio.sleep(0.25)
+	async def until_all_connected():
+		start = time.monotonic()
+		while len(sockets) < count:
+			await asyncio.sleep(0.001)
+		return time.monotonic() - start
+	for mode, clients in (("separate", lambda: [tab(n) for n in range(count)]), ("multiplexed", lambda: [browser()])):
+		server = asyncio.create_task(listen(levels=levels, port=port))
+		await asyncio.sleep(0.1)
+		tasks = [asyncio.create_task(c) for c in clients()]
+		await until_all_connected()
+		connections = len({id(sock) for sock in sockets.values()})
+		frames = updates = 0
+		await asyncio.sleep(seconds)
+		rate, update_rate = frames / seconds, updates / seconds
+		server.cancel()
+		await asyncio.gather(server, return_exceptions=True)
+		while sockets: await asyncio.sleep(0.001)
+		server = asyncio.create_task(listen(levels=levels, port=port))
+		reconnect = await until_all_connected()
+		for task in tasks + [server]:
+			task.cancel()
+		await asyncio.gather(*tasks, server, return_exceptions=True)
+		while sockets: await asyncio.sleep(0.001)
+		print("%-11s %d tabs: %3d connections, %6.0f frames/s, %6.0f tab updates/s, all back %.0fms after restart" % (
+			mode, count, connections, rate, update_rate, reconnect * 1000))
+
 if __name__ == "__main__":
+	import sys
 	try:
-		run()
+		if sys.argv[1:2] == ["bench"]:
+			asyncio.run(bench(int(sys.argv[2]) if len(sys.argv) > 2 else 100))
+		else:
+			run()
 	except KeyboardInterrupt:
 		pass
@@ -18,3 +18,56 @@ webcams = {"Webcam #1 Focus": "/dev/video0", "Webcam #2 Focus": "/dev/video1"}
 
 # Port to connect to OBS WebSocket server
 obs_port = 4444
+
+# Optional: several TellMeVLC instances, possibly on other machines, as
+# channel names to (host, port). If omitted, host and vlc_port above are used.
+# vlc_instances = {"VLC": ("localhost", 4221), "Music": ("studio-pc", 4221)}
+
+# Where mixer snapshots are saved, and how long (seconds) a recall waits for
+# every backend to confirm its new value before reporting stragglers
+snapshot_file = "snapshots.json"
+snapshot_deadline = 1.0
+
+# Optional: port of OBS's v5 WebSocket server (OBS 28+, default 4455), used for
+# volume meters. Leave unset to skip meters and everything that needs them.
+# obs_meter_port = 4455
+
+# Optional: duck target channels (by name) while the trigger OBS input is above
+# threshold dBFS. Depth is in dB; attack and release in seconds.
+# ducking = {"trigger": "Mic/Aux", "targets": ["VLC", "Browser"],
+# 	"threshold": -30, "depth": -15, "attack": 0.05, "release": 0.5}
+
+# Linked (VCA-style) groups: one master fader per group scales its members,
+# named by channel name. Each member has an offset in dB from the master, or
+# None to keep the ratio it had when the group first saw it.
+channel_groups = {
+	# "Music": {"VLC": 0, "Browser": -6},
+}
+
+# Last-known channel layout and values, used to build the window and position
+# the motor immediately on startup. Stand-ins that no backend claims within
+# state_cache_grace seconds are dropped.
+state_cache = "state_cache.json"
+state_cache_grace = 10
+
+# UDP port for OSC remote control (/channel/<name>/volume, /channel/<name>/mute,
+# /subscribe). Leave unset to disable.
+# osc_port = 9000
+
+# Channels per page for fader bank navigation (Navigate menu, Ctrl+PageUp/
+# PageDown and Ctrl+Left/Right, or OSC /page/next, /page/prev, /channel/next,
+# /channel/prev and /channel/<name>/select)
+# page_size = 4
+
+# The power governor reads the Pi's throttle flags (sysfs or vcgencmd) and CPU
+# temperature. Point these at ordinary files to test it, eg: echo 0x50005 > file
+# throttle_source = "/tmp/throttled"
+# thermal_source = "/tmp/temp"
+
+# Where the profiler (Modules menu, SIGUSR1, or OSC /profiler) writes its
+# profile-<timestamp>.txt and .prof files
+# profile_dir = "."
+
+# Port for the web control surface (mixer page for phones and tablets, served
+# over plain HTTP). Leave unset to disable.
+# web_port = 8889
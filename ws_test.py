@@ -1,11 +1,13 @@
 import json
 import subprocess
+import sys
 import time
 import websocket # ImportError? Try: pip install websocket-client
 
+url = sys.argv[1] if len(sys.argv) > 1 else "ws://localhost:8888/ws"
 while True:
 	try:
-		ws = websocket.create_connection("wss://F-35LightningII.rosuav.com:8888/ws")
+		ws = websocket.create_connection(url)
 		break
 	except ConnectionRefusedError:
 		print("Unable to connect, retrying...")